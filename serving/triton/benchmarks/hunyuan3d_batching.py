@@ -0,0 +1,110 @@
+"""Throughput vs. batch size of the split hunyuan3d models against CPU stub pipelines.
+
+hunyuan3d calls its stage models (rembg, shapegen, cleanup, texgen) through
+BLS. Here all five run in the offline harness (triton_common.offline) with the
+instance counts and batching of their config.pbtxt, and a batch is that many
+concurrent requests to hunyuan3d. The stubs sleep for a fixed launch cost plus a per-item cost, which is how
+the GPU pipelines behave: a batched shapegen call amortises the fixed part.
+
+    python benchmarks/hunyuan3d_batching.py --batch-sizes 1 2 4 8
+"""
+
+import argparse
+import io
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import trimesh
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODEL_REPOSITORY = os.path.join(ROOT, "model_repository")
+sys.path.insert(0, ROOT)
+
+from triton_common.offline import ModelRepository, pb_utils
+
+
+class StubBackgroundRemover:
+    cost = 0.005
+
+    def __call__(self, image):
+        time.sleep(self.cost)
+        return image
+
+
+class StubShapegen:
+    launch_cost = 0.2
+    item_cost = 0.02
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def enable_flashvdm(self, **kwargs):
+        pass
+
+    def __call__(self, image, **kwargs):
+        images = image if isinstance(image, list) else [image]
+        time.sleep(self.launch_cost + self.item_cost * len(images))
+        return [trimesh.creation.icosphere(subdivisions=3) for _ in images]
+
+
+class StubTexgen:
+    cost = 0.05
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def __call__(self, mesh, image):
+        time.sleep(self.cost)
+        return mesh
+
+
+STUB_MODULES = {
+    "hy3dgen": {},
+    "hy3dgen.rembg": {"BackgroundRemover": StubBackgroundRemover},
+    "hy3dgen.shapegen": {"Hunyuan3DDiTFlowMatchingPipeline": StubShapegen},
+    "hy3dgen.texgen": {"Hunyuan3DPaintPipeline": StubTexgen},
+}
+
+
+def make_request(index: int) -> pb_utils.InferenceRequest:
+    # Distinct images so the result cache never short-circuits the pipeline
+    buf = io.BytesIO()
+    Image.new("RGBA", (512, 512), (index % 256, index // 256 % 256, 0, 255)).save(buf, format="PNG")
+    image = pb_utils.Tensor("image", np.array([[buf.getvalue()]], dtype=object))
+    return pb_utils.InferenceRequest(model_name="hunyuan3d", inputs=[image])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=16)
+    args = parser.parse_args()
+
+    repository = ModelRepository(MODEL_REPOSITORY, stubs=STUB_MODULES)
+    for stage in ("rembg", "shapegen", "cleanup", "texgen"):
+        repository.load(f"hunyuan3d_{stage}")
+    requests = (make_request(i) for i in itertools.count())
+
+    print(f"{'batch':>5} {'req/s':>8} {'latency/batch':>14}")
+    for batch_size in args.batch_sizes:
+        # No disk cache, every request is new anyway
+        repository.load("hunyuan3d", max_batch_size=batch_size, parameters={"cache_dir": ""})
+        num_batches = max(args.requests // batch_size, 1)
+        start = time.perf_counter()
+        for _ in range(num_batches):
+            streams = [repository.stream(next(requests)) for _ in range(batch_size)]
+            assert not any(response.has_error() for stream in streams for response in stream)
+        elapsed = time.perf_counter() - start
+        repository.unload("hunyuan3d")
+        print(f"{batch_size:>5} {num_batches * batch_size / elapsed:>8.2f} {elapsed / num_batches:>13.3f}s")
+    repository.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""triton_common.mesh against the library mesh cleanup on synthetic meshes.
+
+Each synthetic mesh is a bumpy sphere plus small floating blobs and a few
+degenerate faces. The library implementations (hy3dgen's FloaterRemover /
+DegenerateFaceRemover / FaceReducer, Step1X-3D's remove_degenerate_face /
+reduce_face) are timed too when they are importable.
+
+    python benchmarks/mesh_postprocess.py --faces 100000 500000 1000000 2000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from triton_common import mesh as mesh_ops
+
+
+def sphere(num_faces: int, center=(0.0, 0.0, 0.0), radius: float = 1.0, bumps: float = 0.05):
+    # Latitude/longitude grid with 2 * rows * cols faces, poles included as vertex rings
+    rows = max(int(np.sqrt(num_faces / 4)), 2)
+    cols = max(num_faces // (2 * rows), 3)
+    theta, phi = np.meshgrid(np.linspace(0, np.pi, rows + 1), np.linspace(0, 2 * np.pi, cols, endpoint=False))
+    r = radius * (1 + bumps * np.sin(5 * theta) * np.cos(7 * phi))
+    vertices = np.stack(
+        [r * np.sin(theta) * np.cos(phi), r * np.sin(theta) * np.sin(phi), r * np.cos(theta)], axis=-1
+    ).reshape(-1, 3) + np.asarray(center)
+
+    i, j = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    a = (j * (rows + 1) + i).ravel()
+    b = (((j + 1) % cols) * (rows + 1) + i).ravel()
+    faces = np.concatenate([np.stack([a, b, a + 1], axis=1), np.stack([b, b + 1, a + 1], axis=1)])
+    return vertices.astype(np.float32), faces.astype(np.int64)
+
+
+def synthetic_mesh(num_faces: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    parts = [sphere(num_faces)]
+    for _ in range(20):
+        parts.append(sphere(64, center=rng.uniform(1.5, 2.5, 3), radius=0.02))
+
+    vertices, faces, offset = [], [], 0
+    for v, f in parts:
+        vertices.append(v)
+        faces.append(f + offset)
+        offset += len(v)
+    faces = np.concatenate(faces)
+    # Collapsed faces and exact duplicates
+    degenerate = faces[rng.integers(0, len(faces), 100)].copy()
+    degenerate[:50, 1] = degenerate[:50, 0]
+    return np.concatenate(vertices), np.concatenate([faces, degenerate])
+
+
+def time_call(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def library_cleaners():
+    cleaners = {}
+    try:
+        from hy3dgen.shapegen import DegenerateFaceRemover, FaceReducer, FloaterRemover
+
+        def hy3dgen_clean(mesh, max_faces):
+            for cleaner in [FloaterRemover(), DegenerateFaceRemover()]:
+                mesh = cleaner(mesh)
+            return FaceReducer()(mesh, max_facenum=max_faces)
+
+        cleaners["hy3dgen"] = hy3dgen_clean
+    except ImportError:
+        pass
+    try:
+        from step1x3d_geometry.models.pipelines.pipeline_utils import reduce_face, remove_degenerate_face
+
+        cleaners["step1x3d"] = lambda mesh, max_faces: reduce_face(remove_degenerate_face(mesh), max_facenum=max_faces)
+    except ImportError:
+        pass
+    return cleaners
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--faces", type=int, nargs="+", default=[100_000, 500_000, 1_000_000, 2_000_000])
+    parser.add_argument("--budget", type=int, default=40_000)
+    args = parser.parse_args()
+
+    cleaners = library_cleaners()
+    if not cleaners:
+        print("hy3dgen / step1x3d not importable, timing triton_common.mesh only")
+
+    # The budget is an upper bound down to a single face
+    vertices, faces = synthetic_mesh(min(args.faces))
+    for budget in (1, 10, 100, 1000):
+        _, decimated = mesh_ops.decimate(vertices, faces, budget)
+        assert 0 < len(decimated) <= budget, f"budget {budget}: {len(decimated)} faces"
+    print("decimate stays within budgets of 1, 10, 100 and 1000 faces")
+
+    header = ["faces", "impl", "floaters", "degenerate", "decimate", "total", "out faces"]
+    print(" ".join(f"{name:>{width}}" for name, width in zip(header, [9, 10, 9, 11, 9, 8, 10])))
+    for num_faces in args.faces:
+        vertices, faces = synthetic_mesh(num_faces)
+
+        (v, f), t_floaters = time_call(mesh_ops.remove_floaters, vertices, faces)
+        (v, f), t_degenerate = time_call(mesh_ops.remove_degenerate_faces, v, f)
+        (v, f), t_decimate = time_call(mesh_ops.decimate, v, f, args.budget)
+        assert len(f) <= args.budget, f"{len(f)} faces over the budget of {args.budget}"
+        total = t_floaters + t_degenerate + t_decimate
+        print(
+            f"{len(faces):>9} {'numpy':>10} {t_floaters:>8.2f}s {t_degenerate:>10.2f}s "
+            f"{t_decimate:>8.2f}s {total:>7.2f}s {len(f):>10}"
+        )
+
+        if cleaners:
+            import trimesh
+
+            for name, clean in cleaners.items():
+                mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+                result, elapsed = time_call(clean, mesh, args.budget)
+                print(f"{len(faces):>9} {name:>10} {'':>9} {'':>11} {'':>9} {elapsed:>7.2f}s {len(result.faces):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Round-trip latency of 1-50 MB payloads over HTTP vs. system shared memory.
+
+An echo model (BYTES in, the same BYTES out, like an image going in and a
+GLB coming back) is served by the offline harness's HTTP frontend in a
+separate process, and client/transport.py sends each payload both ways:
+through the request and response bodies, and through pooled shared memory
+regions where only the JSON header crosses the socket. The first shared
+memory request of a size creates and registers its regions; the table is
+the median of the requests after it, which reuse them.
+
+    python benchmarks/shared_memory_transfer.py --sizes-mb 1 5 10 25 50
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import tritonclient.http as httpclient
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "client"))
+
+from transport import SharedMemoryPool, infer
+
+ECHO_CONFIG = """
+name: "echo"
+backend: "python"
+max_batch_size: 0
+input [ { name: "payload", data_type: TYPE_STRING, dims: [ 1 ] } ]
+output [ { name: "payload", data_type: TYPE_STRING, dims: [ 1 ] } ]
+instance_group [ { kind: KIND_CPU, count: 1 } ]
+"""
+
+ECHO_MODEL = """
+import triton_python_backend_utils as pb_utils
+
+
+class TritonPythonModel:
+    def initialize(self, args):
+        pass
+
+    def execute(self, requests):
+        return [
+            pb_utils.InferenceResponse(output_tensors=[pb_utils.get_input_tensor_by_name(request, "payload")])
+            for request in requests
+        ]
+"""
+
+
+def write_repository(path: str):
+    os.makedirs(os.path.join(path, "echo", "1"))
+    with open(os.path.join(path, "echo", "config.pbtxt"), "w") as f:
+        f.write(ECHO_CONFIG)
+    with open(os.path.join(path, "echo", "1", "model.py"), "w") as f:
+        f.write(ECHO_MODEL)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def start_server(repository: str, port: int) -> subprocess.Popen:
+    command = [sys.executable, "-m", "triton_common.offline", "--model-repository", repository, "--model", "echo"]
+    server = subprocess.Popen([*command, "--http-port", str(port)], cwd=ROOT, stderr=subprocess.DEVNULL)
+    client = httpclient.InferenceServerClient(f"localhost:{port}")
+    for _ in range(100):
+        try:
+            if client.is_model_ready("echo"):
+                return server
+        except Exception:
+            pass
+        time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("echo server did not start")
+
+
+def median_latency(client, payload: np.ndarray, pool, repeats: int) -> float:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = infer(client, "echo", {"payload": payload}, {"payload": len(payload.item()) + 4}, pool=pool)
+        latencies.append(time.perf_counter() - start)
+        assert outputs["payload"].item() == payload.item()
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as repository:
+        write_repository(repository)
+        server = start_server(repository, port)
+        try:
+            client = httpclient.InferenceServerClient(f"localhost:{port}", network_timeout=300.0)
+            rng = np.random.default_rng(0)
+            print(f"{'size':>7} {'network':>10} {'shm first':>10} {'shm reused':>11} {'speedup':>8}")
+            with SharedMemoryPool(client, prefix="benchmark") as pool:
+                for size_mb in args.sizes_mb:
+                    payload = np.array([rng.bytes(int(size_mb * 2**20))], dtype=object)
+                    network = median_latency(client, payload, None, args.repeats)
+                    first = median_latency(client, payload, pool, 1)
+                    reused = median_latency(client, payload, pool, args.repeats)
+                    print(
+                        f"{size_mb:>5g}MB {network * 1000:>8.1f}ms {first * 1000:>8.1f}ms "
+                        f"{reused * 1000:>9.1f}ms {network / reused:>7.1f}x"
+                    )
+                print(f"regions created {pool.created}, reused {pool.reused}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Images/s of the stable_diffusion backend vs. concurrent clients, CPU stub pipeline.
+
+Clients send one prompt per request in a closed loop through the offline
+harness (triton_common.offline), whose scheduler groups waiting requests the
+way Triton's dynamic batcher does (max_batch_size, max_queue_delay). The stub
+pipeline sleeps for a fixed launch cost plus a per-image cost, so merging
+prompts into one call amortises the fixed part; max_pipeline_batch=1 is the old one-call-per-request behaviour.
+Every client prompt is new, so the image cache never hits in the table; the
+last line times a fixed-seed request sent twice.
+
+    python benchmarks/stable_diffusion_batching.py --clients 1 2 4 8
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODEL_REPOSITORY = os.path.join(ROOT, "model_repository")
+sys.path.insert(0, ROOT)
+
+from triton_common.offline import ModelRepository
+
+
+class StubGenerator:
+    def __init__(self, device: str = "cpu"):
+        self.device = device
+
+    def manual_seed(self, seed: int) -> "StubGenerator":
+        return self
+
+
+class StubEmbeddings(np.ndarray):
+    def clone(self) -> "StubEmbeddings":
+        return self.copy()
+
+
+class StubScheduler:
+    config: dict = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "StubScheduler":
+        return cls()
+
+
+class StubPipeline:
+    launch_cost = 0.3
+    item_cost = 0.1
+    text_encoder_cost = 0.01
+    _execution_device = "cpu"
+    scheduler = StubScheduler()
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def to(self, device: str) -> "StubPipeline":
+        return self
+
+    def encode_prompt(self, prompt, device, num_images_per_prompt, do_classifier_free_guidance, negative_prompt=None):
+        time.sleep(self.text_encoder_cost)
+        embeds = np.zeros((len(prompt), 77, 8), dtype=np.float16).view(StubEmbeddings)
+        return embeds, embeds.copy()
+
+    def __call__(self, prompt_embeds, num_inference_steps=1, callback_on_step_end=None, **kwargs):
+        # Same cost as before, spread over the steps so cancellation can stop the loop part-way
+        count = len(prompt_embeds)
+        time.sleep(self.launch_cost)
+        for step in range(num_inference_steps):
+            time.sleep(self.item_cost * count / num_inference_steps)
+            if callback_on_step_end is not None:
+                callback_on_step_end(self, step, step, {})
+        images = [Image.new("RGB", (64, 64), (i * 40 % 256, 0, 0)) for i in range(count)]
+        return types.SimpleNamespace(images=images)
+
+
+STUB_MODULES = {
+    "torch": {
+        "Generator": StubGenerator,
+        "float16": "float16",
+        "cat": np.concatenate,
+        "inference_mode": contextlib.nullcontext,
+    },
+    "diffusers": {
+        "DiffusionPipeline": StubPipeline,
+        "DPMSolverMultistepScheduler": StubScheduler,
+        "UniPCMultistepScheduler": StubScheduler,
+        "EulerAncestralDiscreteScheduler": StubScheduler,
+    },
+}
+
+
+def load_model(repository: ModelRepository, max_pipeline_batch: int, max_queue_delay: float):
+    return repository.load(
+        "stable_diffusion",
+        max_batch_size=8,
+        dynamic_batching={"max_queue_delay_microseconds": int(max_queue_delay * 1e6)},
+        # Reloaded for every configuration, the stub needs no warmup
+        parameters={"max_pipeline_batch": max_pipeline_batch, "warmup_batch_sizes": ""},
+    )
+
+
+def run(
+    repository: ModelRepository, clients: int, max_pipeline_batch: int, requests_per_client: int, max_queue_delay: float
+) -> float:
+    load_model(repository, max_pipeline_batch, max_queue_delay)
+
+    def client(index: int):
+        for i in range(requests_per_client):
+            prompt = np.array([[f"client {index} prompt {i}".encode()]], dtype=object)
+            (response,) = repository.infer("stable_diffusion", {"prompt": prompt})
+            assert not response.has_error() and len(response.output_tensors()[0].as_numpy()) == 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    repository.unload("stable_diffusion")
+    return clients * requests_per_client / elapsed
+
+
+def repeat_latency(repository: ModelRepository) -> tuple[float, float]:
+    load_model(repository, 8, 0)
+    inputs = {"prompt": np.array([[b"a repeated prompt"]], dtype=object), "seed": np.array([[7]], dtype=np.int64)}
+    latencies = []
+    for _ in range(2):
+        start = time.perf_counter()
+        repository.infer("stable_diffusion", inputs)
+        latencies.append(time.perf_counter() - start)
+    repository.unload("stable_diffusion")
+    return latencies[0], latencies[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=6, help="requests per client")
+    parser.add_argument("--max-queue-delay-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    repository = ModelRepository(MODEL_REPOSITORY, stubs=STUB_MODULES)
+    delay = args.max_queue_delay_ms / 1000
+    print(f"{'clients':>7} {'per-request img/s':>18} {'merged img/s':>13}")
+    for clients in args.clients:
+        separate = run(repository, clients, 1, args.requests, delay)
+        merged = run(repository, clients, 8, args.requests, delay)
+        print(f"{clients:>7} {separate:>18.2f} {merged:>13.2f}")
+    first, repeated = repeat_latency(repository)
+    print(f"fixed-seed request: first {first * 1000:.0f} ms, repeated {repeated * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""CPU stand-in for the unet TensorRT plan, loaded as its model.py offline.
+
+    repository.load("unet", model_file="benchmarks/unet_plan_standin.py")
+
+With an "onnx_model" parameter, or UNET_ONNX_MODEL in the environment, it runs
+that ONNX export of the network on onnxruntime's CPU provider. Without one it
+is a fixed, seeded 1x1 convolution from the 3 input channels to the class
+logits, which gives logits of the plan's shape and dtype with an argmax that
+follows the image content.
+"""
+
+import json
+import os
+
+import numpy as np
+
+try:
+    import triton_python_backend_utils as pb_utils
+except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+class TritonPythonModel:
+    def initialize(self, args):
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.model_name = model_config.get("name", "unet")
+        output = next(entry for entry in model_config["output"] if entry["name"] == "output")
+        num_classes = int(output["dims"][0])
+
+        self.session = None
+        onnx_model = parameters.get("onnx_model") or os.environ.get("UNET_ONNX_MODEL")
+        if onnx_model:
+            import onnxruntime
+
+            self.session = onnxruntime.InferenceSession(onnx_model, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+        rng = np.random.default_rng(int(parameters.get("seed", 0)))
+        self.weights = rng.standard_normal((num_classes, 3), dtype=np.float32) * 4
+        self.bias = rng.standard_normal((num_classes, 1, 1), dtype=np.float32)
+
+    def execute(self, requests):
+        images = [pb_utils.get_input_tensor_by_name(request, "input").as_numpy() for request in requests]
+        batch = np.concatenate(images)
+        if self.session is not None:
+            logits = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            logits = np.einsum("kc,nchw->nkhw", self.weights, batch, optimize=True) + self.bias
+
+        responses, offset = [], 0
+        for image in images:
+            output = logits[offset : offset + len(image)].astype(np.float32, copy=False)
+            offset += len(image)
+            responses.append(pb_utils.InferenceResponse(output_tensors=[pb_utils.Tensor("output", output)]))
+        return responses
@@ -0,0 +1,132 @@
+"""Response size and latency of unet's raw logits vs. the unet_segmentation ensemble.
+
+The offline harness serves unet, with the CPU stand-in of
+benchmarks/unet_plan_standin.py in place of the TensorRT plan, next to
+unet_postprocess and the unet_segmentation ensemble over KServe v2 HTTP in a
+separate process. Each batch size is requested from both: the FP32 logits
+from unet, and the uint8 mask (plus per-class confidences and the palette
+PNG) from the ensemble. The masks are checked against the argmax of the
+logits, the confidences against a full softmax and the PNGs against the
+masks.
+
+    python benchmarks/unet_postprocess.py --batch-sizes 1 4 8
+    python benchmarks/unet_postprocess.py --onnx-model unet.onnx
+"""
+
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import tritonclient.http as httpclient
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks.shared_memory_transfer import free_port
+
+MODELS = ["unet", "unet_postprocess", "unet_segmentation"]
+
+
+def start_server(port: int, onnx_model: str = "", models: list[str] = MODELS) -> subprocess.Popen:
+    command = [sys.executable, "-m", "triton_common.offline", "--http-port", str(port)]
+    for name in models:
+        command += ["--model", name]
+    command += ["--model-file", f"unet={os.path.join('benchmarks', 'unet_plan_standin.py')}"]
+    env = dict(os.environ, UNET_ONNX_MODEL=onnx_model)
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    client = httpclient.InferenceServerClient(f"localhost:{port}")
+    for _ in range(300):
+        try:
+            if all(client.is_model_ready(name) for name in models):
+                return server
+        except Exception:
+            pass
+        time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("unet server did not start")
+
+
+def infer(client, model_name: str, images: np.ndarray, output_names: list[str]) -> tuple[dict, float]:
+    inputs = [httpclient.InferInput("input", list(images.shape), "FP32")]
+    inputs[0].set_data_from_numpy(images, binary_data=True)
+    outputs = [httpclient.InferRequestedOutput(name, binary_data=True) for name in output_names]
+    start = time.perf_counter()
+    result = client.infer(model_name, inputs, outputs=outputs)
+    seconds = time.perf_counter() - start
+    return {name: result.as_numpy(name) for name in output_names}, seconds
+
+
+def payload_bytes(outputs: dict) -> int:
+    # Binary tensor data of the response; BYTES elements carry a 4-byte length each
+    total = 0
+    for array in outputs.values():
+        if array.dtype == object:
+            total += sum(len(item) + 4 for item in array.ravel())
+        else:
+            total += array.nbytes
+    return total
+
+
+def check_parity(logits: np.ndarray, outputs: dict):
+    masks = outputs["mask"]
+    expected = logits.argmax(axis=1)
+    assert np.array_equal(masks, expected), f"{np.count_nonzero(masks != expected)} mask pixels differ from argmax"
+
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probability = (shifted / shifted.sum(axis=1, keepdims=True)).max(axis=1)
+    for mask, p, confidence in zip(masks, probability, outputs["class_confidence"]):
+        for index in np.unique(mask):
+            np.testing.assert_allclose(confidence[index], p[mask == index].mean(), rtol=1e-4)
+        absent = np.setdiff1d(np.arange(len(confidence)), mask)
+        assert not confidence[absent].any(), "absent classes have a confidence"
+
+    for mask, png in zip(masks, outputs["mask_png"]):
+        image = Image.open(io.BytesIO(png[0]))
+        assert image.mode == "P" and np.array_equal(np.asarray(image), mask), "PNG does not decode to the mask"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--onnx-model", default="", help="ONNX export of unet to run instead of the NumPy stand-in")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(port, args.onnx_model)
+    try:
+        client = httpclient.InferenceServerClient(f"localhost:{port}", network_timeout=300.0)
+        rng = np.random.default_rng(0)
+        print(f"{'batch':>5} {'logits':>10} {'mask':>9} {'all':>9} {'logits ms':>10} {'mask ms':>8} {'all ms':>8}")
+        for batch_size in args.batch_sizes:
+            images = rng.uniform(-1, 1, (batch_size, 3, 256, 256)).astype(np.float32)
+            logits, _ = infer(client, "unet", images, ["output"])
+            everything, _ = infer(client, "unet_segmentation", images, ["mask", "class_confidence", "mask_png"])
+            check_parity(logits["output"], everything)
+
+            latencies = {"logits": [], "mask": [], "all": []}
+            for _ in range(args.repeats):
+                latencies["logits"].append(infer(client, "unet", images, ["output"])[1])
+                latencies["mask"].append(infer(client, "unet_segmentation", images, ["mask"])[1])
+                latencies["all"].append(infer(client, "unet_segmentation", images, list(everything))[1])
+            mask_only = {"mask": everything["mask"]}
+            sizes = [payload_bytes(outputs) / 2**20 for outputs in (logits, mask_only, everything)]
+            ms = [statistics.median(latencies[name]) * 1000 for name in ("logits", "mask", "all")]
+            print(
+                f"{batch_size:>5} {sizes[0]:>8.2f}MB {sizes[1]:>7.2f}MB {sizes[2]:>7.2f}MB "
+                f"{ms[0]:>10.1f} {ms[1]:>8.1f} {ms[2]:>8.1f}"
+            )
+        print("masks match the argmax of the logits, confidences the softmax, PNGs the masks")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
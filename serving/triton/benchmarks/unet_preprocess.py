@@ -0,0 +1,119 @@
+"""Client-side preprocessing vs. encoded uploads to unet_segmentation_image.
+
+The offline harness serves the unet models as in benchmarks/unet_postprocess.py,
+plus unet_preprocess and the unet_segmentation_image ensemble. For synthetic
+photos encoded as JPEG and PNG, each size is sent both ways: decoded, resized
+and normalized on the client and uploaded as FP32 to unet_segmentation, or
+uploaded as the file itself to unet_segmentation_image. The table has the
+upload size, the client CPU time and the end-to-end latency of both, client
+preprocessing included. The unet input unet_preprocess computes must equal the
+client's, and both paths must return the same masks.
+
+    python benchmarks/unet_preprocess.py --sizes 640x480 1920x1080 4032x3024
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import tritonclient.http as httpclient
+from PIL import Image
+from tritonclient.utils import InferenceServerException
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.shared_memory_transfer import free_port
+from benchmarks.unet_postprocess import start_server
+
+MODELS = ["unet", "unet_preprocess", "unet_postprocess", "unet_segmentation", "unet_segmentation_image"]
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def client_preprocess(data: bytes) -> np.ndarray:
+    # What a client does without the ensemble: [1, 3, 256, 256] FP32
+    image = Image.open(io.BytesIO(data)).convert("RGB").resize((256, 256), Image.Resampling.BILINEAR)
+    pixels = (np.asarray(image, dtype=np.uint8).astype(np.float32) / 255.0 - MEAN) / STD
+    return np.ascontiguousarray(pixels.transpose(2, 0, 1))[np.newaxis]
+
+
+def synthetic_photo(width: int, height: int, image_format: str, seed: int = 0) -> bytes:
+    # Smooth color fields with some noise, so the JPEG and PNG sizes are those of a photo
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width] / max(width, height)
+    channels = [np.sin(x * rng.uniform(3, 9) + y * rng.uniform(3, 9) + rng.uniform(0, 6)) for _ in range(3)]
+    pixels = (np.stack(channels, axis=-1) * 100 + 128 + rng.normal(0, 3, (height, width, 3))).clip(0, 255)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+
+def infer(client, model_name: str, name: str, array: np.ndarray, output_names: list[str]) -> tuple[dict, float]:
+    datatype = "BYTES" if array.dtype == object else "FP32"
+    inputs = [httpclient.InferInput(name, list(array.shape), datatype)]
+    inputs[0].set_data_from_numpy(array, binary_data=True)
+    outputs = [httpclient.InferRequestedOutput(output, binary_data=True) for output in output_names]
+    start = time.perf_counter()
+    result = client.infer(model_name, inputs, outputs=outputs)
+    return {output: result.as_numpy(output) for output in output_names}, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "4032x3024"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--onnx-model", default="", help="ONNX export of unet to run instead of the NumPy stand-in")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(port, args.onnx_model, MODELS)
+    try:
+        client = httpclient.InferenceServerClient(f"localhost:{port}", network_timeout=300.0)
+        print(
+            f"{'image':>14} {'FP32 up':>8} {'file up':>8} {'client ms':>10} "
+            f"{'FP32 ms':>8} {'file ms':>8} {'max diff':>9}"
+        )
+        for size in args.sizes:
+            width, height = (int(value) for value in size.split("x"))
+            for image_format in ("JPEG", "PNG"):
+                data = synthetic_photo(width, height, image_format)
+                encoded = np.array([[data]], dtype=object)
+
+                # Parity: the server's unet input and the masks of both paths
+                start = time.perf_counter()
+                local = client_preprocess(data)
+                client_seconds = time.perf_counter() - start
+                try:
+                    remote, _ = infer(client, "unet_preprocess", "image", encoded, ["input"])
+                except InferenceServerException as e:
+                    print(f"{size:>9} {image_format:>4} rejected: {e.message()}")
+                    continue
+                difference = float(np.abs(remote["input"] - local).max())
+                np.testing.assert_allclose(remote["input"], local, rtol=0, atol=1e-6)
+                from_floats, _ = infer(client, "unet_segmentation", "input", local, ["mask"])
+                from_file, _ = infer(client, "unet_segmentation_image", "image", encoded, ["mask"])
+                assert np.array_equal(from_floats["mask"], from_file["mask"]), "masks differ between the paths"
+
+                latencies = {"floats": [], "file": []}
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    infer(client, "unet_segmentation", "input", client_preprocess(data), ["mask"])
+                    latencies["floats"].append(time.perf_counter() - start)
+                    latencies["file"].append(infer(client, "unet_segmentation_image", "image", encoded, ["mask"])[1])
+                ms = {name: statistics.median(values) * 1000 for name, values in latencies.items()}
+                print(
+                    f"{size:>9} {image_format:>4} {local.nbytes / 2**10:>6.0f}KB {len(data) / 2**10:>6.0f}KB "
+                    f"{client_seconds * 1000:>10.1f} {ms['floats']:>8.1f} {ms['file']:>8.1f} {difference:>9.1e}"
+                )
+        print("unet_preprocess matches client-side preprocessing, both paths return the same masks")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Shared client for the image-to-3D models (hunyuan3d, step1x-3d).
+
+Both take an encoded image plus optional quality / mesh_format inputs and
+return a GLB; they differ in model name, whether the model batches (a leading
+batch dimension on every input) and how long a generation may take.
+
+    mesh_client.main("hunyuan3d", batched=True, timeout=180.0)
+"""
+
+import argparse
+import os
+import queue
+
+import tritonclient.grpc as grpcclient
+import tritonclient.http as httpclient
+import numpy as np
+
+import transport
+
+# Triton 서버 주소
+TRITON_URL = "localhost:1237"  # 기본 HTTP 포트
+TRITON_GRPC_URL = "localhost:1238"  # 기본 gRPC 포트 (스트리밍)
+
+
+def as_input(value, batched: bool) -> np.ndarray:
+    # 배치 모델은 [batch, 1], max_batch_size 0 모델은 [1]
+    return np.array([[value]] if batched else [value], dtype=object)
+
+
+# 입력 이미지 로드 및 변환
+def load_image(path: str, batched: bool) -> np.ndarray:
+    with open(path, "rb") as f:
+        image_bytes = f.read()
+    return as_input(image_bytes, batched)
+
+
+def option_values(batched: bool, quality: str = None, mesh_format: str = None) -> dict:
+    # 선택 입력: 품질 프리셋 (draft / standard / high), 출력 포맷 (glb / quantized / compressed)
+    values = {"quality": quality, "mesh_format": mesh_format}
+    return {name: as_input(value, batched) for name, value in values.items() if value is not None}
+
+
+def option_inputs(module, batched: bool, quality: str = None, mesh_format: str = None) -> list:
+    tensors = []
+    for name, value_np in option_values(batched, quality, mesh_format).items():
+        tensor = module.InferInput(name=name, shape=value_np.shape, datatype="BYTES")
+        tensor.set_data_from_numpy(value_np)
+        tensors.append(tensor)
+    return tensors
+
+
+def print_sizes(as_numpy):
+    # as_numpy: 출력 이름 -> 배열 (InferResult.as_numpy 또는 dict.get)
+    original_size = as_numpy("original_size").reshape(-1)[0]
+    compressed_size = as_numpy("compressed_size").reshape(-1)[0]
+    print(f"GLB 크기: {original_size / 2**20:.2f}MB -> {compressed_size / 2**20:.2f}MB")
+
+
+def save_mesh(glb_bytes: bytes, path: str):
+    with open(path, "wb") as f:
+        f.write(glb_bytes)
+    print(f"GLB 파일 저장 완료: {path}")
+
+
+def output_path(image_path: str, num_images: int) -> str:
+    if num_images == 1:
+        return "output_mesh.glb"
+    return f"output_mesh_{os.path.splitext(os.path.basename(image_path))[0]}.glb"
+
+
+def infer(
+    model_name: str,
+    batched: bool,
+    timeout: float,
+    image_paths: list,
+    quality: str = None,
+    mesh_format: str = None,
+    network: bool = False,
+    output_mb: int = 64,
+):
+    # Triton HTTP client 생성
+    client = httpclient.InferenceServerClient(url=TRITON_URL, verbose=False, network_timeout=timeout)
+
+    # 같은 호스트의 Triton이면 입출력을 공유 메모리로 전달, 영역은 이미지 사이에 재사용
+    prefix = model_name.replace("-", "_")
+    pool = None if network else transport.SharedMemoryPool(client, prefix=prefix)
+    outputs = {"mesh": output_mb * 2**20, "original_size": 8, "compressed_size": 8}
+    try:
+        for path in image_paths:
+            # 추론 요청
+            inputs = {"image": load_image(path, batched), **option_values(batched, quality, mesh_format)}
+            # Triton 모델 이름 (디렉토리 이름)
+            result = transport.infer(client, model_name, inputs, outputs, pool=pool, timeout=180000000)
+
+            # 출력 받기
+            output = result["mesh"]
+            if output is None:
+                raise RuntimeError("Failed to get mesh output from Triton server")
+            save_mesh(output.reshape(-1)[0], output_path(path, len(image_paths)))
+            print_sizes(result.get)
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+def infer_stream(
+    model_name: str, batched: bool, timeout: float, image_np: np.ndarray, quality: str = None, mesh_format: str = None
+):
+    # decoupled 모델: 텍스처 없는 메쉬가 먼저, 텍스처 메쉬가 마지막으로 도착
+    results = queue.Queue()
+    client = grpcclient.InferenceServerClient(url=TRITON_GRPC_URL, verbose=False)
+    client.start_stream(callback=lambda result, error: results.put((result, error)), stream_timeout=timeout)
+
+    input_tensor = grpcclient.InferInput(name="image", shape=image_np.shape, datatype="BYTES")
+    input_tensor.set_data_from_numpy(image_np)
+    inputs = [input_tensor, *option_inputs(grpcclient, batched, quality, mesh_format)]
+    client.async_stream_infer(model_name=model_name, inputs=inputs)
+
+    try:
+        while True:
+            result, error = results.get(timeout=timeout)
+            if error is not None:
+                raise RuntimeError(f"Triton stream error: {error}")
+            stage = result.as_numpy("stage").reshape(-1)[0].decode("utf-8")
+            glb_bytes = result.as_numpy("mesh").reshape(-1)[0]
+            if stage == "geometry":
+                save_mesh(glb_bytes, "output_mesh_preview.glb")
+            else:
+                save_mesh(glb_bytes, "output_mesh.glb")
+                print_sizes(result.as_numpy)
+                break
+    finally:
+        # 중단(Ctrl+C, 타임아웃) 시 서버에 남은 요청도 취소해 GPU 작업을 멈춤
+        client.stop_stream(cancel_requests=True)
+
+
+def main(model_name: str, batched: bool, timeout: float):
+    # timeout: 한 요청의 생성 대기 시간 (초)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--image", nargs="+", default=["assets/pikachu.png"], help="여러 장이면 한 연결로 차례로 변환"
+    )
+    parser.add_argument("--stream", action="store_true", help="decoupled 모델에서 미리보기 메쉬를 먼저 받기 (gRPC)")
+    parser.add_argument("--quality", choices=["draft", "standard", "high"], help="생략하면 서버 기본값")
+    parser.add_argument(
+        "--format",
+        choices=["glb", "quantized", "compressed"],
+        help="메쉬 압축 포맷, 생략하면 서버 기본값 (compressed는 EXT_meshopt_compression 지원 뷰어 필요)",
+    )
+    parser.add_argument(
+        "--network",
+        action="store_true",
+        help="공유 메모리 대신 HTTP 본문으로 전송 (Triton이 다른 호스트에 있을 때)",
+    )
+    parser.add_argument(
+        "--shm-output-mb", type=int, default=64, help="공유 메모리 출력 영역 크기, GLB보다 커야 함"
+    )
+    args = parser.parse_args()
+
+    if args.stream:
+        # 스트리밍은 gRPC 네트워크 전송만 사용
+        image_np = load_image(args.image[0], batched)
+        infer_stream(model_name, batched, timeout, image_np, args.quality, args.format)
+    else:
+        infer(model_name, batched, timeout, args.image, args.quality, args.format, args.network, args.shm_output_mb)
@@ -1,7 +1,18 @@
-from socket import timeout
-from tritonclient.http import InferenceServerClient, InferInput
+import argparse
+import os
+import sys
+
+from tritonclient.http import InferenceServerClient
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import transport
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--network", action="store_true", help="send tensors in the HTTP body instead of shared memory")
+args = parser.parse_args()
+
 # Connect to Triton via HTTP
 client = InferenceServerClient(url="localhost:1234", connection_timeout=120)
 
@@ -9,15 +20,36 @@ client = InferenceServerClient(url="localhost:1234", connection_timeout=120)
 prompts = ["a cat on the moon", "a robot in Tokyo", "a fireman in Korea", "Hansome an American"]
 batch_size = len(prompts)
 
-# Create input tensor
-input_tensor = InferInput(name="prompt", shape=[batch_size, 1], datatype="BYTES")
-input_tensor.set_data_from_numpy(np.array(prompts, dtype=object).reshape(batch_size, 1))
+# Output encoding: png, jpeg or webp
+image_format = "png"
+
+# Generation settings: default, dpm++, unipc or euler_a (dpm++/unipc need fewer steps)
+scheduler = "dpm++"
+seed = 42  # -1 for a random seed; the n-th prompt uses seed + n
+
+# Input tensors
+inputs = {
+    "prompt": np.array(prompts, dtype=object).reshape(batch_size, 1),
+    "image_format": np.array([image_format] * batch_size, dtype=object).reshape(batch_size, 1),
+    "scheduler": np.array([scheduler] * batch_size, dtype=object).reshape(batch_size, 1),
+    "seed": np.array([seed] * batch_size, dtype=np.int64).reshape(batch_size, 1),
+}
+
+# Room for the encoded images when they come back through shared memory; a 1024x1024 PNG stays under 4 MB
+outputs = {"image": batch_size * 4 * 2**20, "seed": 8 * batch_size}
 
-# Send inference request
-response = client.infer(model_name="stable_diffusion", inputs=[input_tensor], timeout=120 * 10 ^ 6)
+# Send inference request, through shared memory when Triton runs on this host
+pool = None if args.network else transport.SharedMemoryPool(client, prefix="stable_diffusion")
+try:
+    response = transport.infer(client, "stable_diffusion", inputs, outputs, pool=pool, timeout=120 * 10**6)
+finally:
+    if pool is not None:
+        pool.close()
 
 # Extract output
-output = response.as_numpy("image")  # Should be shape: (batch_size, variable_length)
-for i, img_bytes in enumerate(output):
-    with open(f"output_{i}.png", "wb") as f:
+output = response["image"]  # Shape: (batch_size, 1), one exact-length encoded image each
+seeds = response["seed"].reshape(-1)
+for i, img_bytes in enumerate(output.reshape(-1)):
+    print(f"output_{i}.{image_format} : seed {seeds[i]}")
+    with open(f"output_{i}.{image_format}", "wb") as f:
         f.write(img_bytes)
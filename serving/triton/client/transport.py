@@ -0,0 +1,149 @@
+"""Tensor transport for the HTTP clients: system shared memory or the network.
+
+When the client runs on the same host as Triton (and the container shares the
+host IPC namespace, see docker-compose.yaml), inputs and outputs go through
+registered POSIX shared memory regions instead of the HTTP body. Regions are
+expensive to create and register, so a SharedMemoryPool keeps them and hands
+them out again for later requests of the same or a smaller size.
+
+    with SharedMemoryPool(client) as pool:
+        outputs = infer(client, "hunyuan3d", {"image": image_np}, {"mesh": 64 * 2**20}, pool=pool)
+
+Without a pool, infer() sends the same request over the network.
+"""
+
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import tritonclient.http as httpclient
+import tritonclient.utils.shared_memory as shm
+from tritonclient.utils import np_to_triton_dtype, serialize_byte_tensor, triton_to_np_dtype
+
+# Regions are created in power-of-two sizes from here up, so they fit more later payloads
+MIN_REGION_BYTES = 2**20
+
+# Smaller tensors (prompts, options, sizes) go in the HTTP body, a region would not save a copy worth its setup
+SHARED_MEMORY_MIN_BYTES = 64 * 2**10
+
+
+class Region:
+    def __init__(self, name: str, byte_size: int):
+        self.name = name
+        self.key = f"/{name}"
+        self.byte_size = byte_size
+        self.handle = shm.create_shared_memory_region(name, self.key, byte_size, create_only=True)
+
+
+class SharedMemoryPool:
+    # Regions registered with one server, reused across requests until close()
+    def __init__(self, client: httpclient.InferenceServerClient, prefix: str = "client"):
+        self._client = client
+        self._prefix = f"{prefix}_{os.getpid()}_{id(self):x}"
+        self._regions: list[Region] = []
+        self._free: list[Region] = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, byte_size: int) -> Region:
+        with self._lock:
+            # Smallest free region that fits
+            fitting = [region for region in self._free if region.byte_size >= byte_size]
+            if fitting:
+                region = min(fitting, key=lambda region: region.byte_size)
+                self._free.remove(region)
+                self.reused += 1
+                return region
+            region = Region(f"{self._prefix}_{len(self._regions)}", _region_size(byte_size))
+            self._regions.append(region)
+            self.created += 1
+        try:
+            self._client.register_system_shared_memory(region.name, region.key, region.byte_size)
+        except Exception:
+            with self._lock:
+                self._regions.remove(region)
+            shm.destroy_shared_memory_region(region.handle)
+            raise
+        return region
+
+    def release(self, *regions: Region):
+        with self._lock:
+            self._free.extend(regions)
+
+    def close(self):
+        with self._lock:
+            regions, self._regions, self._free = self._regions, [], []
+        for region in regions:
+            self._client.unregister_system_shared_memory(region.name)
+            shm.destroy_shared_memory_region(region.handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _region_size(byte_size: int) -> int:
+    return max(MIN_REGION_BYTES, 1 << (byte_size - 1).bit_length())
+
+
+def _serialize(array: np.ndarray) -> np.ndarray:
+    # Shared memory holds BYTES tensors in the wire format: 4-byte length, then the bytes
+    return serialize_byte_tensor(array) if array.dtype == np.object_ else np.ascontiguousarray(array)
+
+
+def _byte_size(serialized: np.ndarray) -> int:
+    return len(serialized.item()) if serialized.dtype == np.object_ else serialized.nbytes
+
+
+def infer(
+    client: httpclient.InferenceServerClient,
+    model_name: str,
+    inputs: dict[str, np.ndarray],
+    outputs: dict[str, int],
+    pool: Optional[SharedMemoryPool] = None,
+    **kwargs,
+) -> dict[str, np.ndarray]:
+    # outputs maps each output to the most bytes it may take, Triton rejects a request whose output
+    # does not fit into its region. Without a pool, or for small tensors, the bytes go over the network.
+    regions: dict[str, Region] = {}
+    try:
+        tensors = []
+        for name, array in inputs.items():
+            tensor = httpclient.InferInput(name, list(array.shape), np_to_triton_dtype(array.dtype))
+            serialized = _serialize(array)
+            if pool is None or _byte_size(serialized) < SHARED_MEMORY_MIN_BYTES:
+                tensor.set_data_from_numpy(array)
+            else:
+                regions[name] = pool.acquire(_byte_size(serialized))
+                shm.set_shared_memory_region(regions[name].handle, [serialized])
+                tensor.set_shared_memory(regions[name].name, _byte_size(serialized))
+            tensors.append(tensor)
+        requested = []
+        for name, byte_size in outputs.items():
+            output = httpclient.InferRequestedOutput(name)
+            if pool is not None and byte_size >= SHARED_MEMORY_MIN_BYTES:
+                # Outputs get their own regions, an input region may still be read while outputs are written
+                region = regions[f"output:{name}"] = pool.acquire(byte_size)
+                output.set_shared_memory(region.name, region.byte_size)
+            requested.append(output)
+
+        result = client.infer(model_name, tensors, outputs=requested, **kwargs)
+        arrays = {}
+        for name in outputs:
+            region = regions.get(f"output:{name}")
+            if region is None:
+                arrays[name] = result.as_numpy(name)
+                continue
+            entry = result.get_output(name)
+            dtype = triton_to_np_dtype(entry["datatype"])
+            contents = shm.get_contents_as_numpy(region.handle, dtype, entry["shape"])
+            # Copied out, the region is handed to the next request
+            arrays[name] = contents if dtype == np.object_ else contents.copy()
+        return arrays
+    finally:
+        if pool is not None:
+            pool.release(*regions.values())
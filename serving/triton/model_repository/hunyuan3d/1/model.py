@@ -1,81 +1,384 @@
-from PIL import Image
-from hy3dgen.rembg import BackgroundRemover
-from hy3dgen.shapegen import Hunyuan3DDiTFlowMatchingPipeline, FaceReducer, FloaterRemover, DegenerateFaceRemover
-from hy3dgen.texgen import Hunyuan3DPaintPipeline
+from triton_common.cache import ResultCache
+from triton_common.cancellation import count_cancelled, error_response
+from triton_common.glb import MESH_FORMATS, compress_glb
+from triton_common.images import decode_image
+from triton_common.metrics import ModelMetrics
+from triton_common.params import resolve_params
+from triton_common.singleflight import Flight, SingleFlight
+from triton_common.staged import Stage, StagedPipeline
+from triton_common.warmup import run_warmup, warmup_batch_sizes
+from concurrent.futures import Future
+from typing import Callable, Optional
 
 import numpy as np
-import io, logging, time
+import functools, json, logging, threading, time
+import trimesh
 
 logging.basicConfig(level=logging.INFO)
 
+# Named quality tiers, each key can also be overridden per request by an optional input
+QUALITY_PRESETS = {
+    "draft": {"octree_resolution": 192, "num_inference_steps": 20, "face_budget": 10000, "texture": False},
+    "standard": {"octree_resolution": 256, "num_inference_steps": 30, "face_budget": 20000, "texture": True},
+    "high": {"octree_resolution": 320, "num_inference_steps": 50, "face_budget": 40000, "texture": True},
+}
+# Allowed range of each override; the GPU pipelines are shared, so a huge octree or
+# step count would take memory and time from every other request
+PARAM_BOUNDS = {"octree_resolution": (64, 512), "num_inference_steps": (1, 100), "face_budget": (1, 200000)}
+
+# Stages that call a stage model; a job whose request was cancelled is dropped before
+# any of them. Export and encode still run, the finished mesh goes into the cache.
+BLS_STAGES = ("rembg", "shapegen", "cleanup", "texgen")
+
 try:
     import triton_python_backend_utils as pb_utils
 except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+class Job:
+    def __init__(
+        self,
+        image_bytes: bytes,
+        key: str,
+        params: dict,
+        output: dict,
+        on_geometry: Optional[Callable[[bytes], None]] = None,
+        is_cancelled: Callable[[], bool] = lambda: False,
+    ):
+        self.image_bytes = image_bytes
+        self.key = key
+        self.params = params
+        self.output = output
+        self.on_geometry = on_geometry
+        self.is_cancelled = is_cancelled
+        self.image = None  # [1, height, width, 4] decoded input, then its foreground
+        self.vertices = None  # [1, vertices, 3]
+        self.faces = None  # [1, faces, 3]
+        self.glb = None
+        self.encoded = None
+        self.flight: Optional[Flight] = None  # Set on the job that generates for identical requests
+
+
+def untextured_glb(vertices: np.ndarray, faces: np.ndarray) -> bytes:
+    return trimesh.Trimesh(vertices[0], faces[0], process=False).export(file_type="glb")
+
+
+def mesh_response(glbs: list[bytes], stage: Optional[str] = None, original_sizes: Optional[list[int]] = None):
+    # original_size is the plain GLB, compressed_size what is actually sent
+    sizes = [len(glb) for glb in glbs]
+    output_tensors = [
+        pb_utils.Tensor("mesh", np.array(glbs, dtype=object).reshape(-1, 1)),
+        pb_utils.Tensor("original_size", np.array(original_sizes or sizes, dtype=np.int64).reshape(-1, 1)),
+        pb_utils.Tensor("compressed_size", np.array(sizes, dtype=np.int64).reshape(-1, 1)),
+    ]
+    if stage is not None:
+        output_tensors.append(pb_utils.Tensor("stage", np.array([[stage]] * len(glbs), dtype=object)))
+    return pb_utils.InferenceResponse(output_tensors=output_tensors)
+
+
+def forward(source: Future, target: Future):
+    error = source.exception()
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
 
-    class DummyOutput:
-        def as_numpy(self) -> np.ndarray:
-            return np.ndarray((-1))
 
-    class pb_utils:
-        @staticmethod
-        def get_input_tensor_by_name(request, name: str) -> DummyOutput:
-            return DummyOutput()
+def encoded_response(jobs: list[Job], stage: Optional[str] = None):
+    return mesh_response([job.encoded for job in jobs], stage, [len(job.glb) for job in jobs])
 
-        class InferenceResponse:
-            def __call__(self, *args, **kwds):
-                pass
 
-        class Tensor:
-            def __call__(self, *args, **kwds):
-                pass
+class MeshStream:
+    # Decoupled mode: sends the cleaned, untextured meshes of a request as soon as
+    # all of them exist, then the textured meshes as the final response.
+    def __init__(self, sender, count: int):
+        self._sender = sender
+        self._lock = threading.Lock()
+        self._previews: list[Optional[bytes]] = [None] * count
+        self._jobs: list[Optional[Job]] = [None] * count
+        self._finished = False
+
+    def geometry(self, index: int, glb: bytes):
+        with self._lock:
+            self._previews[index] = glb
+            if not self._finished and all(p is not None for p in self._previews):
+                self._sender.send(mesh_response(self._previews, "geometry"))
+
+    def done(self, index: int, future: Future):
+        with self._lock:
+            if self._finished:
+                return
+            error = future.exception()
+            if error is not None:
+                self._finished = True
+                self._sender.send(error_response(pb_utils, error), flags=pb_utils.TRITONSERVER_RESPONSE_COMPLETE_FINAL)
+                return
+            self._jobs[index] = future.result()
+            if all(job is not None for job in self._jobs):
+                self._finished = True
+                response = encoded_response(self._jobs, "textured")
+                self._sender.send(response, flags=pb_utils.TRITONSERVER_RESPONSE_COMPLETE_FINAL)
 
 
 class TritonPythonModel:
+    # Entry point of the split pipeline. Background removal, shape generation,
+    # mesh cleanup and texture synthesis are separate Triton models, each with its
+    # own instances, batching and placement; this model calls them through BLS
+    # and keeps the presets, the result cache, output encoding and streaming.
     def initialize(self, args):
-        # Load Shape Generator
-        self.pipeline_shapegen: Hunyuan3DDiTFlowMatchingPipeline = Hunyuan3DDiTFlowMatchingPipeline.from_pretrained(
-            "tencent/Hunyuan3D-2mini", subfolder="hunyuan3d-dit-v2-mini", use_safetensors=False
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.max_batch_size = max(model_config.get("max_batch_size", 0), 1)
+        self.decoupled = pb_utils.using_decoupled_model_transaction_policy(model_config)
+        self.metrics = ModelMetrics(pb_utils, model_config.get("name", "hunyuan3d"))
+        self.stage_models = {stage: parameters.get(f"{stage}_model", f"hunyuan3d_{stage}") for stage in BLS_STAGES}
+
+        # Everything that changes the generated mesh is part of the cache key
+        self.default_quality = parameters.get("default_quality", "high")
+        self.default_mesh_format = parameters.get("default_mesh_format", "glb")
+        self.model_ids = {
+            "shapegen": "tencent/Hunyuan3D-2mini/hunyuan3d-dit-v2-mini",
+            "texgen": "tencent/Hunyuan3D-2",
+        }
+        self.cache = ResultCache(
+            parameters.get("cache_dir", ""),
+            max_memory_bytes=int(parameters.get("cache_memory_mb", 512)) * 2**20,
+            max_disk_bytes=int(parameters.get("cache_disk_mb", 10240)) * 2**20,
         )
-        self.pipeline_shapegen.enable_flashvdm(topk_mode="merge")
+        # Jobs being generated, by cache key: an identical request that comes in before
+        # the result is cached waits for that job instead of generating it again
+        self.flights = SingleFlight()
 
-        # Load Texture Synthesizer
-        self.pipeline_texgen: Hunyuan3DPaintPipeline = Hunyuan3DPaintPipeline.from_pretrained("tencent/Hunyuan3D-2")
+        # Uploads are decoded straight at the working resolution; larger ones than the
+        # byte and pixel limits are rejected before any stage model sees them
+        self.input_max_side = int(parameters.get("input_max_side", 1024))
+        self.input_max_bytes = int(parameters.get("input_max_mb", 20)) * 2**20
+        self.input_max_pixels = int(float(parameters.get("input_max_megapixels", 50)) * 1e6)
+
+        # Stages backed by a stage model keep up to stage_inflight BLS requests in
+        # flight, so the stage model's dynamic batcher has something to batch.
+        # Decode, export and encode run here on CPU worker pools. Cached GLBs enter
+        # at the encode stage.
+        cpu_workers = int(parameters.get("cpu_workers", 4))
+        inflight = int(parameters.get("stage_inflight", 2 * self.max_batch_size))
+        queue_size = int(parameters.get("stage_queue_size", 2 * self.max_batch_size))
+        self.engine = StagedPipeline(
+            [
+                Stage("decode", self._decode, workers=cpu_workers, queue_size=queue_size),
+                Stage("rembg", self._remove_background, workers=inflight, queue_size=queue_size),
+                Stage("shapegen", self._generate_shape, workers=inflight, queue_size=queue_size),
+                Stage("cleanup", self._clean_mesh, workers=inflight, queue_size=queue_size),
+                Stage("texgen", self._generate_texture, workers=inflight, queue_size=queue_size),
+                Stage("export", self._export, workers=cpu_workers, queue_size=queue_size),
+                Stage("encode", self._encode, workers=cpu_workers, queue_size=queue_size),
+            ],
+            observer=self.metrics.observe,
+            cancelled=self._cancelled,
+        )
+        self.engine.start()
 
-        # Load Background Remover
-        self.rembg = BackgroundRemover()
+        # The stage models warm themselves up and may not be loaded yet, so no BLS here;
+        # only the output encoders that run in this model, once per mesh format
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self.metrics)
 
     def execute(self, requests):
+        self.metrics.observe_batch("execute", len(requests))
+        if self.decoupled:
+            # Responses are sent from the stage workers, execute returns right away
+            for request in requests:
+                self._stream(request)
+            return None
+
         start = time.time()
-        responses = []
 
+        # 1. Submit every image of every request in the batch to the stage engine, unless cached
+        futures = []
         for request in requests:
-            # 1. Get input tensor
+            try:
+                params, output = self._params(request), self._output_format(request)
+            except ValueError as e:
+                futures.append(e)
+                continue
             input_tensor = pb_utils.get_input_tensor_by_name(request, "image")
-            image_bytes = input_tensor.as_numpy().squeeze()  # np.object_ 배열
-            logging.info(f"image_bytes type: {type(image_bytes)}")
-            image = Image.open(io.BytesIO(image_bytes.item())).convert("RGBA")
+            images_bytes = input_tensor.as_numpy().reshape(-1)  # np.object_ 배열, [batch, 1] -> [batch]
+            futures.append(
+                [
+                    self._submit(image_bytes, params, output, is_cancelled=request.is_cancelled)
+                    for image_bytes in images_bytes
+                ]
+            )
+
+        # 2. Collect GLBs back per request
+        responses = []
+        for request_futures in futures:
+            try:
+                if isinstance(request_futures, Exception):
+                    raise request_futures
+                jobs = [future.result() for future in request_futures]
+            except Exception as e:
+                responses.append(error_response(pb_utils, e))
+                continue
+            responses.append(encoded_response(jobs))
 
-            # 2. Remove background
-            image = self.rembg(image)
+        self.metrics.observe("execute", time.time() - start)
+        logging.info(f"Batch size : {len(requests)}, Latency : {time.time() - start} sec")
+        logging.info(f"Stages : {self.engine.format_stats()}")
+        logging.info(f"Cache : {self.cache.format_stats()}")
+        logging.info(f"Flights : {self.flights.format_stats()}")
+        return responses
 
-            # 3. Shape Generation
-            mesh = self.pipeline_shapegen(image=image, octree_resolution=320)[0]
+    def finalize(self):
+        self.engine.shutdown()
 
-            # 4. Clean Mesh
-            for cleaner in [FloaterRemover(), DegenerateFaceRemover()]:
-                mesh = cleaner(mesh)
-            mesh = FaceReducer()(mesh)
+    def _warmup(self, batch_size: int):
+        sphere = trimesh.creation.icosphere(subdivisions=4)
+        glb = untextured_glb(sphere.vertices[np.newaxis], sphere.faces[np.newaxis])
+        for _ in range(batch_size):
+            for output in MESH_FORMATS.values():
+                compress_glb(glb, **output)
 
-            # 5. Texture Synthesis
-            mesh = self.pipeline_texgen(mesh, image=image)
+    def _params(self, request) -> dict:
+        return resolve_params(
+            request, pb_utils.get_input_tensor_by_name, QUALITY_PRESETS, self.default_quality, bounds=PARAM_BOUNDS
+        )
 
-            # 6. Export textured mesh to GLB
-            glb_bytes = mesh.export(file_type="glb")
+    def _output_format(self, request) -> dict:
+        return resolve_params(
+            request, pb_utils.get_input_tensor_by_name, MESH_FORMATS, self.default_mesh_format, selector="mesh_format"
+        )
 
-            # 7. Output tensor
-            mesh_tensor = pb_utils.Tensor("mesh", np.array([glb_bytes], dtype=object))
-            inference_response = pb_utils.InferenceResponse(output_tensors=[mesh_tensor])
-            responses.append(inference_response)
+    def _stream(self, request):
+        sender = request.get_response_sender()
+        try:
+            params, output = self._params(request), self._output_format(request)
+        except ValueError as e:
+            sender.send(error_response(pb_utils, e), flags=pb_utils.TRITONSERVER_RESPONSE_COMPLETE_FINAL)
+            return
 
-        logging.info(f"Latency : {time.time() - start} sec")
-        return responses
+        images_bytes = pb_utils.get_input_tensor_by_name(request, "image").as_numpy().reshape(-1)
+        stream = MeshStream(sender, len(images_bytes))
+        for index, image_bytes in enumerate(images_bytes):
+            # Geometry-only requests have nothing to preview, the final mesh is the untextured one
+            on_geometry = functools.partial(stream.geometry, index) if params["texture"] else None
+            future = self._submit(image_bytes, params, output, on_geometry, request.is_cancelled)
+            future.add_done_callback(functools.partial(stream.done, index))
+
+    def _submit(
+        self,
+        image_bytes: bytes,
+        params: dict,
+        output: dict,
+        on_geometry: Optional[Callable[[bytes], None]] = None,
+        is_cancelled: Callable[[], bool] = lambda: False,
+    ) -> Future:
+        # The cache holds plain GLBs, every output format is encoded from them
+        key = ResultCache.key(image_bytes, **self.model_ids, **params)
+        job = Job(image_bytes, key, params, output, on_geometry, is_cancelled)
+        job.glb = self.cache.get(job.key)
+        if job.glb is not None:
+            return self.engine.submit(job, stage="encode")
+
+        # Not cached yet: join the identical job in flight, or generate for everyone who joins
+        # this one. The flight is only dropped once all of its requests are cancelled
+        flight, leader = self.flights.join(key, is_cancelled, on_geometry)
+        if not leader:
+            self.metrics.increment("singleflight_joined")
+            return self._follow(flight, job)
+        job.flight = flight
+        job.is_cancelled = flight.is_cancelled
+        job.on_geometry = flight.preview if self.decoupled and params["texture"] else None
+        future = self.engine.submit(job)
+        flight.track(future)
+        return future
+
+    def _follow(self, flight: Flight, job: Job) -> Future:
+        # A joined job gets the generated GLB and only goes through encode, in its own format
+        future: Future = Future()
+
+        def landed(flight_future: Future):
+            if flight_future.exception() is not None:
+                future.set_exception(flight_future.exception())
+                return
+            job.glb = flight_future.result()
+            self.engine.submit(job, stage="encode").add_done_callback(functools.partial(forward, target=future))
+
+        flight.future.add_done_callback(landed)
+        return future
+
+    def _cancelled(self, job: Job, stage: str) -> bool:
+        # A BLS call in flight cannot be taken back, so the check runs before each one;
+        # untextured jobs pass texgen without a call and keep their finished mesh
+        if stage not in BLS_STAGES or (stage == "texgen" and not job.params["texture"]) or not job.is_cancelled():
+            return False
+        count_cancelled(self.metrics, stage)
+        return True
+
+    def _infer(self, stage: str, inputs: dict[str, np.ndarray], output_names: list[str]) -> dict[str, np.ndarray]:
+        request = pb_utils.InferenceRequest(
+            model_name=self.stage_models[stage],
+            requested_output_names=output_names,
+            inputs=[pb_utils.Tensor(name, array) for name, array in inputs.items()],
+        )
+        response = request.exec()
+        if response.has_error():
+            raise RuntimeError(f"{self.stage_models[stage]}: {response.error().message()}")
+        return {name: pb_utils.get_output_tensor_by_name(response, name).as_numpy() for name in output_names}
+
+    def _decode(self, job: Job) -> Job:
+        try:
+            image = decode_image(
+                job.image_bytes, self.input_max_side, self.input_max_bytes, self.input_max_pixels, metrics=self.metrics
+            )
+        except ValueError:
+            self.metrics.increment("input_rejected")
+            raise
+        job.image = np.asarray(image, dtype=np.uint8)[np.newaxis]
+        return job
+
+    def _remove_background(self, job: Job) -> Job:
+        job.image = self._infer("rembg", {"image": job.image}, ["image"])["image"]
+        return job
+
+    def _generate_shape(self, job: Job) -> Job:
+        inputs = {
+            "image": job.image,
+            "octree_resolution": np.array([[job.params["octree_resolution"]]], dtype=np.int32),
+            "num_inference_steps": np.array([[job.params["num_inference_steps"]]], dtype=np.int32),
+        }
+        outputs = self._infer("shapegen", inputs, ["vertices", "faces"])
+        job.vertices, job.faces = outputs["vertices"], outputs["faces"]
+        return job
+
+    def _clean_mesh(self, job: Job) -> Job:
+        inputs = {
+            "vertices": job.vertices,
+            "faces": job.faces,
+            "face_budget": np.array([[job.params["face_budget"]]], dtype=np.int32),
+        }
+        outputs = self._infer("cleanup", inputs, ["vertices", "faces"])
+        job.vertices, job.faces = outputs["vertices"], outputs["faces"]
+        if job.on_geometry is not None:
+            job.on_geometry(untextured_glb(job.vertices, job.faces))
+        return job
+
+    def _generate_texture(self, job: Job) -> Job:
+        if job.params["texture"]:
+            inputs = {"vertices": job.vertices, "faces": job.faces, "image": job.image}
+            job.glb = self._infer("texgen", inputs, ["mesh"])["mesh"].reshape(-1)[0]
+        return job
+
+    def _export(self, job: Job) -> Job:
+        # Textured meshes come back from texgen as GLB already
+        if job.glb is None:
+            job.glb = untextured_glb(job.vertices, job.faces)
+        job.image = job.vertices = job.faces = None
+        self.cache.put(job.key, job.glb)
+        if job.flight is not None:
+            job.flight.land(job.glb)
+        return job
+
+    def _encode(self, job: Job) -> Job:
+        job.encoded = compress_glb(job.glb, **job.output)
+        return job
@@ -0,0 +1,59 @@
+from triton_common.cancellation import error_response
+from triton_common.metrics import ModelMetrics
+from triton_common.mesh import clean_trimesh
+from triton_common.warmup import execute_requests, run_warmup, warmup_batch_sizes
+
+import numpy as np
+import json, logging, time
+import trimesh
+
+logging.basicConfig(level=logging.INFO)
+
+try:
+    import triton_python_backend_utils as pb_utils
+except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+class TritonPythonModel:
+    # Floaters, degenerate faces and decimation down to the face budget, NumPy only
+    def initialize(self, args):
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.model_name = model_config.get("name", "hunyuan3d_cleanup")
+        self.metrics = ModelMetrics(pb_utils, self.model_name)
+
+        # NumPy only, but the first call still pays for lazy imports and allocations
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self.metrics)
+
+    def execute(self, requests):
+        start = time.time()
+        responses = []
+        for request in requests:
+            vertices = pb_utils.get_input_tensor_by_name(request, "vertices").as_numpy()[0]
+            faces = pb_utils.get_input_tensor_by_name(request, "faces").as_numpy()[0]
+            face_budget = int(pb_utils.get_input_tensor_by_name(request, "face_budget").as_numpy().reshape(-1)[0])
+            try:
+                with self.metrics.time("cleanup"):
+                    mesh = clean_trimesh(trimesh.Trimesh(vertices, faces, process=False), face_budget)
+            except Exception as e:
+                responses.append(error_response(pb_utils, e))
+                continue
+            output_tensors = [
+                pb_utils.Tensor("vertices", np.asarray(mesh.vertices, dtype=np.float32)[np.newaxis]),
+                pb_utils.Tensor("faces", np.asarray(mesh.faces, dtype=np.int32)[np.newaxis]),
+            ]
+            responses.append(pb_utils.InferenceResponse(output_tensors=output_tensors))
+
+        logging.info(f"cleanup : {len(requests)} requests, Latency : {time.time() - start} sec")
+        return responses
+
+    def _warmup(self, batch_size: int):
+        sphere = trimesh.creation.icosphere(subdivisions=5)
+        inputs = {
+            "vertices": np.asarray(sphere.vertices, dtype=np.float32)[np.newaxis],
+            "faces": np.asarray(sphere.faces, dtype=np.int32)[np.newaxis],
+            "face_budget": np.array([[len(sphere.faces) // 2]], dtype=np.int32),
+        }
+        execute_requests(pb_utils, self, [inputs] * batch_size, ["vertices", "faces"])
@@ -0,0 +1,58 @@
+from PIL import Image
+from triton_common.cancellation import error_response
+from triton_common.metrics import ModelMetrics
+from triton_common.warmup import execute_requests, run_warmup, warmup_batch_sizes, warmup_image_bytes
+
+import numpy as np
+import io, json, logging, time
+
+logging.basicConfig(level=logging.INFO)
+
+try:
+    import triton_python_backend_utils as pb_utils
+except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+class TritonPythonModel:
+    # Cuts out the foreground of the input image. hunyuan3d decodes the upload at the
+    # working resolution and sends its RGBA pixels; the output is what shapegen and
+    # texgen consume.
+    def initialize(self, args):
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.model_name = model_config.get("name", "hunyuan3d_rembg")
+        self.metrics = ModelMetrics(pb_utils, self.model_name)
+
+        from hy3dgen.rembg import BackgroundRemover
+
+        self.rembg = BackgroundRemover()
+
+        # The first call creates the onnxruntime session
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self.metrics)
+
+    def execute(self, requests):
+        start = time.time()
+        responses = []
+        for request in requests:
+            try:
+                pixels = pb_utils.get_input_tensor_by_name(request, "image").as_numpy()
+                if len(pixels) != 1:
+                    raise ValueError("hunyuan3d_rembg takes one image per request")
+                image = Image.fromarray(pixels[0], "RGBA")
+                with self.metrics.time("rembg"):
+                    image = self.rembg(image)
+            except Exception as e:
+                responses.append(error_response(pb_utils, e))
+                continue
+            pixels = np.asarray(image.convert("RGBA"), dtype=np.uint8)[np.newaxis]
+            responses.append(pb_utils.InferenceResponse(output_tensors=[pb_utils.Tensor("image", pixels)]))
+
+        logging.info(f"rembg : {len(requests)} requests, Latency : {time.time() - start} sec")
+        return responses
+
+    def _warmup(self, batch_size: int):
+        image = np.asarray(Image.open(io.BytesIO(warmup_image_bytes())).convert("RGBA"), dtype=np.uint8)
+        inputs = {"image": image[np.newaxis]}
+        execute_requests(pb_utils, self, [inputs] * batch_size, ["image"])
@@ -0,0 +1,110 @@
+from PIL import Image
+from triton_common.cancellation import RequestCancelled, count_cancelled, error_response, is_cancelled, step_callback
+from triton_common.metrics import ModelMetrics
+from triton_common.warmup import execute_requests, run_warmup, warmup_batch_sizes, warmup_image_bytes
+
+import numpy as np
+import io, json, logging, os, time
+
+logging.basicConfig(level=logging.INFO)
+
+try:
+    import triton_python_backend_utils as pb_utils
+except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+def scalar(request, name: str) -> int:
+    return int(pb_utils.get_input_tensor_by_name(request, name).as_numpy().reshape(-1)[0])
+
+
+class TritonPythonModel:
+    # Foreground image in, untextured mesh out as vertex and face arrays. Requests
+    # of a dynamic batch that share resolution and step count run as one call.
+    def initialize(self, args):
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.model_name = model_config.get("name", "hunyuan3d_shapegen")
+        self.metrics = ModelMetrics(pb_utils, self.model_name)
+
+        # hy3dgen resolves "<HY3DGEN_MODELS>/<repo>/<subfolder>" before it falls back to the hub
+        if parameters.get("model_dir"):
+            os.environ["HY3DGEN_MODELS"] = parameters["model_dir"]
+
+        from hy3dgen.shapegen import Hunyuan3DDiTFlowMatchingPipeline
+
+        try:
+            # safetensors are memory-mapped instead of unpickled into RAM
+            self.pipeline = Hunyuan3DDiTFlowMatchingPipeline.from_pretrained(
+                "tencent/Hunyuan3D-2mini", subfolder="hunyuan3d-dit-v2-mini", use_safetensors=True
+            )
+        except FileNotFoundError:
+            logging.warning("No safetensors checkpoint for shapegen, loading the pickled one")
+            self.pipeline = Hunyuan3DDiTFlowMatchingPipeline.from_pretrained(
+                "tencent/Hunyuan3D-2mini", subfolder="hunyuan3d-dit-v2-mini", use_safetensors=False
+            )
+        self.pipeline.enable_flashvdm(topk_mode="merge")
+
+        # Batches of the bundled image at the resolution of the default preset; the
+        # volume decoder's kernels depend on it, the step count only adds time
+        self.warmup_params = {
+            "octree_resolution": int(parameters.get("warmup_octree_resolution", 320)),
+            "num_inference_steps": int(parameters.get("warmup_num_inference_steps", 5)),
+        }
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self.metrics)
+
+    def execute(self, requests):
+        start = time.time()
+        self.metrics.observe_batch("execute", len(requests))
+
+        # 1. Group the requests by the settings a pipeline call is made with; requests
+        #    cancelled while queued are answered right away
+        responses = [None] * len(requests)
+        groups: dict[tuple[int, int], list[int]] = {}
+        for index, request in enumerate(requests):
+            if is_cancelled(request):
+                responses[index] = error_response(pb_utils, RequestCancelled("shapegen"))
+                count_cancelled(self.metrics, "shapegen")
+                continue
+            key = (scalar(request, "octree_resolution"), scalar(request, "num_inference_steps"))
+            groups.setdefault(key, []).append(index)
+
+        # 2. One batched pipeline call per group. It stops at the denoising step by which
+        #    all of its requests are cancelled; hy3dgen takes the callback through **kwargs
+        for (octree_resolution, num_inference_steps), members in groups.items():
+            images = [
+                Image.fromarray(pb_utils.get_input_tensor_by_name(requests[i], "image").as_numpy()[0], "RGBA")
+                for i in members
+            ]
+            all_cancelled = lambda: all(is_cancelled(requests[i]) for i in members)
+            try:
+                with self.metrics.time("shapegen", batch_size=len(images)):
+                    meshes = self.pipeline(
+                        image=images,
+                        octree_resolution=octree_resolution,
+                        num_inference_steps=num_inference_steps,
+                        callback=step_callback(all_cancelled, "shapegen"),
+                    )
+            except Exception as e:
+                if isinstance(e, RequestCancelled):
+                    count_cancelled(self.metrics, "shapegen", len(members))
+                for i in members:
+                    responses[i] = error_response(pb_utils, e)
+                continue
+            for i, mesh in zip(members, meshes):
+                output_tensors = [
+                    pb_utils.Tensor("vertices", np.asarray(mesh.vertices, dtype=np.float32)[np.newaxis]),
+                    pb_utils.Tensor("faces", np.asarray(mesh.faces, dtype=np.int32)[np.newaxis]),
+                ]
+                responses[i] = pb_utils.InferenceResponse(output_tensors=output_tensors)
+
+        logging.info(f"shapegen : {len(requests)} requests, {len(groups)} calls, Latency : {time.time() - start} sec")
+        return responses
+
+    def _warmup(self, batch_size: int):
+        image = np.asarray(Image.open(io.BytesIO(warmup_image_bytes())).convert("RGBA"), dtype=np.uint8)
+        inputs = {"image": image[np.newaxis]}
+        for name, value in self.warmup_params.items():
+            inputs[name] = np.array([[value]], dtype=np.int32)
+        execute_requests(pb_utils, self, [inputs] * batch_size, ["vertices", "faces"])
@@ -0,0 +1,96 @@
+from PIL import Image
+from triton_common.cancellation import RequestCancelled, count_cancelled, error_response, is_cancelled
+from triton_common.metrics import ModelMetrics
+from triton_common.residency import LazyComponent
+from triton_common.warmup import execute_requests, run_warmup, warmup_batch_sizes, warmup_image_bytes
+
+import numpy as np
+import io, json, logging, os, time
+import trimesh
+
+logging.basicConfig(level=logging.INFO)
+
+try:
+    import triton_python_backend_utils as pb_utils
+except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+def move_paint_pipeline(pipeline, device: str):
+    # The paint pipeline holds two diffusers pipelines, delight and multiview; the renderer stays put
+    for model in pipeline.models.values():
+        model.pipeline.to(device)
+
+
+class TritonPythonModel:
+    # Cleaned mesh and foreground image in, textured GLB out
+    def initialize(self, args):
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.model_name = model_config.get("name", "hunyuan3d_texgen")
+        self.metrics = ModelMetrics(pb_utils, self.model_name)
+
+        # hy3dgen resolves "<HY3DGEN_MODELS>/<repo>/<subfolder>" before it falls back to the hub
+        if parameters.get("model_dir"):
+            os.environ["HY3DGEN_MODELS"] = parameters["model_dir"]
+
+        from hy3dgen.texgen import Hunyuan3DPaintPipeline
+
+        # Loaded on first use, offloaded or unloaded again once idle or above the device memory
+        # ceiling, so the memory is free for other models while only untextured meshes are asked for
+        self.pipeline = LazyComponent(
+            "texgen",
+            lambda: Hunyuan3DPaintPipeline.from_pretrained("tencent/Hunyuan3D-2"),
+            self.metrics,
+            offload=parameters.get("offload", "cpu"),
+            move=move_paint_pipeline,
+            idle_seconds=float(parameters.get("idle_seconds", 300)),
+            device_memory_limit_bytes=int(parameters.get("device_memory_limit_mb", 0)) * 2**20,
+            host_memory_limit_bytes=int(parameters.get("host_memory_limit_mb", 0)) * 2**20,
+        )
+
+        # Texturing runs one mesh per call, a sphere and the bundled image warm every kernel.
+        # Only a preloaded pipeline is warmed up, otherwise the first textured request pays for both
+        if parameters.get("preload", "false").lower() == "true":
+            self.pipeline.preload()
+            run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self.metrics)
+
+    def execute(self, requests):
+        start = time.time()
+        responses = []
+        for request in requests:
+            # The paint pipeline has no step callback, so a cancelled request is only skipped before its call
+            if is_cancelled(request):
+                responses.append(error_response(pb_utils, RequestCancelled("texgen")))
+                count_cancelled(self.metrics, "texgen")
+                continue
+            vertices = pb_utils.get_input_tensor_by_name(request, "vertices").as_numpy()[0]
+            faces = pb_utils.get_input_tensor_by_name(request, "faces").as_numpy()[0]
+            image = pb_utils.get_input_tensor_by_name(request, "image").as_numpy()[0]
+            try:
+                with self.pipeline.use() as pipeline, self.metrics.time("texgen"):
+                    mesh = pipeline(trimesh.Trimesh(vertices, faces, process=False), image=Image.fromarray(image))
+                with self.metrics.time("export"):
+                    glb = mesh.export(file_type="glb")
+            except Exception as e:
+                responses.append(error_response(pb_utils, e))
+                continue
+            mesh_tensor = pb_utils.Tensor("mesh", np.array([[glb]], dtype=object))
+            responses.append(pb_utils.InferenceResponse(output_tensors=[mesh_tensor]))
+
+        logging.info(f"texgen : {len(requests)} requests, Latency : {time.time() - start} sec")
+        return responses
+
+    def finalize(self):
+        self.pipeline.close()
+
+    def _warmup(self, batch_size: int):
+        sphere = trimesh.creation.icosphere(subdivisions=4)
+        image = np.asarray(Image.open(io.BytesIO(warmup_image_bytes())).convert("RGBA"), dtype=np.uint8)
+        inputs = {
+            "vertices": np.asarray(sphere.vertices, dtype=np.float32)[np.newaxis],
+            "faces": np.asarray(sphere.faces, dtype=np.int32)[np.newaxis],
+            "image": image[np.newaxis],
+        }
+        execute_requests(pb_utils, self, [inputs] * batch_size, ["mesh"])
@@ -1,69 +1,326 @@
-import torch
-from diffusers import DiffusionPipeline, ImagePipelineOutput
+from triton_common.cancellation import (
+    RequestCancelled,
+    count_cancelled,
+    error_response,
+    is_cancelled,
+    step_callback_kwargs,
+)
+from triton_common.loading import load_components, local_model_path
+from triton_common.lru import LRUCache
+from triton_common.metrics import ModelMetrics
+from triton_common.params import resolve_params
+from triton_common.warmup import execute_requests, run_warmup, warmup_batch_sizes
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import time
+import json, logging, random, time
+
+logging.basicConfig(level=logging.INFO)
+
+# Per-request output encodings; image_quality is ignored by the lossless PNG encoder
+IMAGE_FORMATS = {
+    "png": {"pil_format": "PNG", "image_quality": 100},
+    "jpeg": {"pil_format": "JPEG", "image_quality": 90},
+    "webp": {"pil_format": "WEBP", "image_quality": 90},
+}
+
+# Per-request generation settings, selected by scheduler name. Every key can be
+# overridden by an optional input of the same name; seed -1 draws a random seed.
+# "default" keeps the scheduler the model ships with at the diffusers defaults,
+# the multistep solvers give comparable images in far fewer steps.
+_GENERATION_DEFAULTS = {"guidance_scale": 7.5, "height": 768, "width": 768, "seed": -1}
+GENERATION_PRESETS = {
+    "default": {"scheduler": "default", "num_inference_steps": 50, **_GENERATION_DEFAULTS},
+    "dpm++": {"scheduler": "dpm++", "num_inference_steps": 20, **_GENERATION_DEFAULTS},
+    "unipc": {"scheduler": "unipc", "num_inference_steps": 20, **_GENERATION_DEFAULTS},
+    "euler_a": {"scheduler": "euler_a", "num_inference_steps": 30, **_GENERATION_DEFAULTS},
+}
+SCHEDULER_CLASSES = {
+    "dpm++": "DPMSolverMultistepScheduler",
+    "unipc": "UniPCMultistepScheduler",
+    "euler_a": "EulerAncestralDiscreteScheduler",
+}
+MAX_INFERENCE_STEPS = 150
+MIN_RESOLUTION, MAX_RESOLUTION = 256, 1024
 
 try:
     import triton_python_backend_utils as pb_utils
 except ImportError:
-    class DummyOutput:
-        def as_numpy(self) -> np.ndarray:
-            pass
-        
-    class pb_utils:
-        @staticmethod
-        def get_input_tensor_by_name(request, name: str) -> DummyOutput:
-            pass
-        
-        class InferenceResponse:                
-            def __call__(self, *args, **kwds):
-                pass
-            
-        class Tensor:
-            def __call__(self, *args, **kwds):
-                pass
-        
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
 import io
 
+
+def encode_image(image, pil_format: str, image_quality: int) -> bytes:
+    buf = io.BytesIO()
+    if pil_format == "PNG":
+        image.save(buf, format="PNG")
+    else:
+        image.save(buf, format=pil_format, quality=image_quality)
+    return buf.getvalue()
+
+
+def embeddings_size(entry) -> int:
+    prompt_embeds, negative_prompt_embeds = entry
+    return prompt_embeds.nbytes + negative_prompt_embeds.nbytes
+
+
 class TritonPythonModel:
     def initialize(self, args):
-        model_id = "stabilityai/stable-diffusion-2"
-        self._pipeline = DiffusionPipeline.from_pretrained(
-            model_id, torch_dtype=torch.float16
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self._model_path = local_model_path(parameters.get("model_dir", ""), "stabilityai/stable-diffusion-2")
+        self._metrics = ModelMetrics(pb_utils, model_config.get("name", "stable_diffusion"))
+        # Prompts from all requests of a dynamic batch share diffusion loops of at most this many images
+        self._max_pipeline_batch = int(parameters.get("max_pipeline_batch", 8))
+        self._default_image_format = parameters.get("default_image_format", "png")
+        self._default_scheduler = parameters.get("default_scheduler", "default")
+        # Images are encoded side by side instead of one after the other on the request thread
+        self._encoder = ThreadPoolExecutor(
+            max_workers=int(parameters.get("encode_workers", 4)), thread_name_prefix="image-encode"
         )
-        self._pipeline.to("cuda")
-        self._generator = torch.Generator("cuda").manual_seed(0)
+
+        # Text-encoder outputs per (prompt, negative prompt), kept on the GPU
+        self._prompt_cache = LRUCache(int(parameters.get("prompt_cache_mb", 256)) * 2**20, size_of=embeddings_size)
+        # Encoded images per (prompts, seed, generation settings, encoding); with a fixed seed the
+        # same tuple always produces the same image, so repeats skip the diffusion loop entirely
+        self._image_cache = LRUCache(int(parameters.get("image_cache_mb", 512)) * 2**20)
+
+        self._pipeline = load_components({"pipeline": self._load_pipeline})["pipeline"]
+
+        # One batch per size the dynamic batcher forms, at the default resolution and a few steps:
+        # kernels and allocations depend on batch and image size, not on the step count
+        self.model_name = model_config.get("name", "stable_diffusion")
+        self._warmup_prompt = parameters.get("warmup_prompt", "a red apple on a wooden table")
+        self._warmup_steps = int(parameters.get("warmup_num_inference_steps", 2))
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self._metrics)
+
+    def _load_pipeline(self):
+        import diffusers
+        import torch
+        from diffusers import DiffusionPipeline
+
+        # safetensors weights are memory-mapped instead of unpickled
+        pipeline = DiffusionPipeline.from_pretrained(self._model_path, torch_dtype=torch.float16, use_safetensors=True)
+        pipeline.to("cuda")
+
+        # One instance per scheduler, all built from the model's own scheduler config
+        self._schedulers = {"default": pipeline.scheduler}
+        for name, class_name in SCHEDULER_CLASSES.items():
+            scheduler_class = getattr(diffusers, class_name)
+            self._schedulers[name] = scheduler_class.from_config(pipeline.scheduler.config)
+        return pipeline
 
     def execute(self, requests):
         start = time.time()
-        responses = []
+        self._metrics.observe_batch("execute", len(requests))
 
-        for request in requests:
+        # 1. Collect the prompts of every request in the batch, remembering where each came from.
+        #    Every prompt gets its own seed, so its image does not depend on the rest of the batch
+        prompts: list[str] = []
+        negative_prompts: list[str] = []
+        seeds: list[int] = []
+        owners: list[int] = []
+        formats: list = []
+        settings: list = []
+        cancelled: set[int] = set()  # Requests whose client gave up; nothing more is generated for them
+        for index, request in enumerate(requests):
+            if is_cancelled(request):
+                cancelled.add(index)
+                count_cancelled(self._metrics, "diffusion")
+                formats.append(None)
+                settings.append(None)
+                continue
+            try:
+                image_format, params = self._image_format(request), self._generation_params(request)
+                formats.append(image_format)
+                settings.append(params)
+            except ValueError as e:
+                formats.append(e)
+                settings.append(e)
+                continue
             prompt_input = pb_utils.get_input_tensor_by_name(request, "prompt")
-            prompt_array: np.ndarray = prompt_input.as_numpy().astype(object).squeeze(-1)
-            prompts: list[str] = [p.decode("utf-8") for p in prompt_array if isinstance(p, bytes)]
-
-            # Run diffusion pipeline
-            output: ImagePipelineOutput = self._pipeline(prompts, generator=self._generator)
-            images = output.images  # List of PIL.Image
-
-            images_bytes_list = []
-            for image in images:
-                buf = io.BytesIO()
-                image.save(buf, format="PNG")
-                image_bytes = np.frombuffer(buf.getvalue(), dtype=np.uint8)
-                images_bytes_list.append(image_bytes)
-                
-            max_len = max(len(b) for b in images_bytes_list)
-            padded_images = np.zeros((len(images_bytes_list), max_len), dtype=np.uint8)
-            
-            for i, b in enumerate(images_bytes_list):
-                padded_images[i, :len(b)] = b
-
-            print(padded_images.shape)
-            out_tensor = pb_utils.Tensor("image", padded_images)
-            inference_response = pb_utils.InferenceResponse(output_tensors=[out_tensor])
-            responses.append(inference_response)
-
-        print("latency : ", time.time() - start)
+            prompt_array: np.ndarray = prompt_input.as_numpy().astype(object).reshape(-1)
+            negative_input = pb_utils.get_input_tensor_by_name(request, "negative_prompt")
+            negative_prompt = ""
+            if negative_input is not None:
+                negative_prompt = negative_input.as_numpy().reshape(-1)[0].decode("utf-8")
+            request_prompts = [p.decode("utf-8") for p in prompt_array if isinstance(p, bytes)]
+            for offset, prompt in enumerate(request_prompts):
+                prompts.append(prompt)
+                negative_prompts.append(negative_prompt)
+                seeds.append(params["seed"] + offset)
+                owners.append(index)
+
+        # 2. Answer prompts generated before from the image cache
+        cache_keys = [
+            self._image_cache_key(prompts[i], negative_prompts[i], seeds[i], settings[owner], formats[owner])
+            for i, owner in enumerate(owners)
+        ]
+        images_bytes_list = [self._image_cache.get(key) for key in cache_keys]
+        pending = [i for i, cached in enumerate(images_bytes_list) if cached is None]
+        self._metrics.increment("image_cache_hit", len(prompts) - len(pending))
+        self._metrics.increment("image_cache_miss", len(pending))
+
+        # 3. Group the remaining prompts whose requests share scheduler, steps, guidance and size;
+        #    each group runs through as few diffusion loops as the cap allows. A loop leaves out the
+        #    requests cancelled by then and stops at the step by which all of its requests are cancelled
+        buckets: dict[tuple, list[int]] = {}
+        for i in pending:
+            buckets.setdefault(self._bucket_key(settings[owners[i]]), []).append(i)
+
+        images = [None] * len(prompts)  # List of PIL.Image
+        for (scheduler, steps, guidance_scale, height, width), members in buckets.items():
+            self._pipeline.scheduler = self._schedulers[scheduler]
+            for chunk_start in range(0, len(members), self._max_pipeline_batch):
+                chunk = members[chunk_start : chunk_start + self._max_pipeline_batch]
+                newly_cancelled = {owners[i] for i in chunk if is_cancelled(requests[owners[i]])} - cancelled
+                count_cancelled(self._metrics, "diffusion", len(newly_cancelled))
+                cancelled |= newly_cancelled
+                chunk = [i for i in chunk if owners[i] not in cancelled]
+                if not chunk:
+                    continue
+                prompt_embeds, negative_prompt_embeds = self._embed(
+                    [prompts[i] for i in chunk], [negative_prompts[i] for i in chunk]
+                )
+                chunk_owners = {owners[i] for i in chunk}
+                try:
+                    with self._metrics.time("diffusion", batch_size=len(chunk)):
+                        output = self._pipeline(
+                            prompt_embeds=prompt_embeds,
+                            negative_prompt_embeds=negative_prompt_embeds,
+                            num_inference_steps=steps,
+                            guidance_scale=guidance_scale,
+                            height=height,
+                            width=width,
+                            generator=self._generators([seeds[i] for i in chunk]),
+                            **step_callback_kwargs(
+                                self._pipeline,
+                                lambda: all(is_cancelled(requests[owner]) for owner in chunk_owners),
+                                "diffusion",
+                            ),
+                        )
+                except RequestCancelled:
+                    count_cancelled(self._metrics, "diffusion", len(chunk_owners - cancelled))
+                    cancelled |= chunk_owners
+                    continue
+                for i, image in zip(chunk, output.images):
+                    images[i] = image
+        if buckets:
+            self._metrics.observe_batch("parameter_buckets", len(buckets))
+
+        # 4. Encode every new image in the requested format on the encoder pool and cache it
+        pending = [i for i in pending if owners[i] not in cancelled]
+        if pending:
+            with self._metrics.time("image_encode", batch_size=len(pending)):
+                encoded = {i: self._encoder.submit(encode_image, images[i], **formats[owners[i]]) for i in pending}
+                for i, future in encoded.items():
+                    images_bytes_list[i] = future.result()
+                    self._image_cache.put(cache_keys[i], images_bytes_list[i])
+
+        # 5. Hand every request back its own images, one exact-length bytes element each, and the
+        #    seed of each so that a random-seed image can be reproduced
+        responses = []
+        for index in range(len(requests)):
+            if index in cancelled:
+                responses.append(error_response(pb_utils, RequestCancelled("diffusion")))
+                continue
+            if isinstance(formats[index], Exception):
+                responses.append(error_response(pb_utils, formats[index]))
+                continue
+            request_images = [b for b, owner in zip(images_bytes_list, owners) if owner == index]
+            request_seeds = [seed for seed, owner in zip(seeds, owners) if owner == index]
+            out_tensor = pb_utils.Tensor("image", np.array(request_images, dtype=object).reshape(-1, 1))
+            seed_tensor = pb_utils.Tensor("seed", np.array(request_seeds, dtype=np.int64).reshape(-1, 1))
+            responses.append(pb_utils.InferenceResponse(output_tensors=[out_tensor, seed_tensor]))
+
+        for name, cache in (("prompt_cache", self._prompt_cache), ("image_cache", self._image_cache)):
+            cache_stats = cache.stats()
+            self._metrics.set(f"{name}_hit_ratio", cache_stats["hit_ratio"])
+            self._metrics.set(f"{name}_bytes", cache_stats["bytes"])
+        self._metrics.observe("execute", time.time() - start)
+        logging.info(
+            f"stable_diffusion : {len(requests)} requests, {len(prompts)} prompts, {len(pending)} generated, "
+            f"{len(buckets)} parameter buckets, Latency : {time.time() - start} sec"
+        )
+        logging.debug(f"prompt cache : {self._prompt_cache.format_stats()}")
+        logging.debug(f"image cache : {self._image_cache.format_stats()}")
         return responses
+
+    def finalize(self):
+        self._encoder.shutdown()
+
+    def _warmup(self, batch_size: int):
+        # Requests of one prompt each, like a dynamic batch; distinct seeds so the image cache stays out of it
+        inputs = [
+            {
+                "prompt": np.array([[f"{self._warmup_prompt} {i}".encode()]], dtype=object),
+                "seed": np.array([[batch_size * 1000 + i]], dtype=np.int64),
+                "num_inference_steps": np.array([[self._warmup_steps]], dtype=np.int32),
+            }
+            for i in range(batch_size)
+        ]
+        execute_requests(pb_utils, self, inputs, ["image", "seed"])
+
+    def _embed(self, prompts: list[str], negative_prompts: list[str]):
+        import torch
+
+        keys = list(zip(prompts, negative_prompts))
+        embeddings = {key: self._prompt_cache.get(key) for key in dict.fromkeys(keys)}
+        misses = [key for key, entry in embeddings.items() if entry is None]
+        if misses:
+            # One text-encoder pass for every distinct prompt that is not cached yet
+            with self._metrics.time("text_encode", batch_size=len(misses)), torch.inference_mode():
+                prompt_embeds, negative_prompt_embeds = self._pipeline.encode_prompt(
+                    [prompt for prompt, _ in misses],
+                    self._pipeline._execution_device,
+                    1,
+                    True,
+                    negative_prompt=[negative for _, negative in misses],
+                )
+            for i, key in enumerate(misses):
+                embeddings[key] = (prompt_embeds[i : i + 1].clone(), negative_prompt_embeds[i : i + 1].clone())
+                self._prompt_cache.put(key, embeddings[key])
+
+        return (
+            torch.cat([embeddings[key][0] for key in keys]),
+            torch.cat([embeddings[key][1] for key in keys]),
+        )
+
+    def _image_format(self, request) -> dict:
+        return resolve_params(
+            request, pb_utils.get_input_tensor_by_name, IMAGE_FORMATS, self._default_image_format, "image_format"
+        )
+
+    def _generation_params(self, request) -> dict:
+        params = resolve_params(
+            request, pb_utils.get_input_tensor_by_name, GENERATION_PRESETS, self._default_scheduler, "scheduler"
+        )
+        if not 1 <= params["num_inference_steps"] <= MAX_INFERENCE_STEPS:
+            raise ValueError(f"num_inference_steps must be between 1 and {MAX_INFERENCE_STEPS}")
+        for key in ("height", "width"):
+            if not MIN_RESOLUTION <= params[key] <= MAX_RESOLUTION or params[key] % 8:
+                raise ValueError(f"{key} must be a multiple of 8 between {MIN_RESOLUTION} and {MAX_RESOLUTION}")
+        if params["seed"] < 0:
+            params["seed"] = random.randrange(2**31)
+        return params
+
+    @staticmethod
+    def _bucket_key(params: dict) -> tuple:
+        # Everything but the seed has to match for prompts to share a diffusion call
+        return (
+            params["scheduler"],
+            params["num_inference_steps"],
+            params["guidance_scale"],
+            params["height"],
+            params["width"],
+        )
+
+    @classmethod
+    def _image_cache_key(cls, prompt: str, negative_prompt: str, seed: int, params: dict, image_format: dict) -> tuple:
+        return (prompt, negative_prompt, seed, cls._bucket_key(params), tuple(sorted(image_format.items())))
+
+    def _generators(self, seeds: list[int]) -> list:
+        import torch
+
+        device = self._pipeline._execution_device
+        return [torch.Generator(device).manual_seed(seed) for seed in seeds]
@@ -2,88 +2,328 @@ from PIL import Image
 import warnings
 
 warnings.filterwarnings("ignore")
-import os
-import trimesh
-from step1x3d_texture.pipelines.step1x_3d_texture_synthesis_pipeline import (
-    Step1X3DTexturePipeline,
+from triton_common.cache import ResultCache
+from triton_common.cancellation import (
+    RequestCancelled,
+    count_cancelled,
+    error_response,
+    raise_if_cancelled,
+    step_callback_kwargs,
 )
+from triton_common.glb import MESH_FORMATS, compress_glb
+from triton_common.images import decode_image
+from triton_common.loading import load_components, local_model_path
+from triton_common.metrics import ModelMetrics
+from triton_common.mesh import clean_trimesh
+from triton_common.params import resolve_params
+from triton_common.residency import LazyComponent
+from triton_common.warmup import run_warmup, warmup_batch_sizes, warmup_image_bytes
+from triton_common.workdir import Workdir
 
-from step1x3d_geometry.models.pipelines.pipeline_utils import reduce_face, remove_degenerate_face
-from step1x3d_geometry.models.pipelines.pipeline import Step1X3DGeometryPipeline
-import torch
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Union
 
 import numpy as np
-import io, logging, time, uuid
+import json, logging, os, time
 
 logging.basicConfig(level=logging.INFO)
 
+# Named quality tiers, each key can also be overridden per request by an optional input
+QUALITY_PRESETS = {
+    "draft": {"num_inference_steps": 15, "guidance_scale": 7.5, "face_budget": 20000, "texture": False},
+    "standard": {"num_inference_steps": 30, "guidance_scale": 7.5, "face_budget": 100000, "texture": True},
+    "high": {"num_inference_steps": 50, "guidance_scale": 7.5, "face_budget": 200000, "texture": True},
+}
+# Allowed range of each override; the GPU pipelines are shared, so a huge step count
+# would take time from every other request
+PARAM_BOUNDS = {"num_inference_steps": (1, 100), "guidance_scale": (1.0, 20.0), "face_budget": (1, 500000)}
+
 try:
     import triton_python_backend_utils as pb_utils
 except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+def mesh_response(glb_bytes: bytes, stage: Optional[str] = None, original_size: Optional[int] = None):
+    # original_size is the plain GLB, compressed_size what is actually sent
+    output_tensors = [
+        pb_utils.Tensor("mesh", np.array([glb_bytes], dtype=object)),
+        pb_utils.Tensor("original_size", np.array([original_size or len(glb_bytes)], dtype=np.int64)),
+        pb_utils.Tensor("compressed_size", np.array([len(glb_bytes)], dtype=np.int64)),
+    ]
+    if stage is not None:
+        output_tensors.append(pb_utils.Tensor("stage", np.array([stage], dtype=object)))
+    return pb_utils.InferenceResponse(output_tensors=output_tensors)
 
-    class DummyOutput:
-        def as_numpy(self) -> np.ndarray:
-            return np.ndarray((-1))
 
-    class pb_utils:
-        @staticmethod
-        def get_input_tensor_by_name(request, name: str) -> DummyOutput:
-            return DummyOutput()
+def encoded_response(glb_bytes: Optional[bytes], future: Union[Future, Exception], stage: Optional[str] = None):
+    # future is the compress_glb future, or the exception that kept the request from being generated
+    try:
+        if isinstance(future, Exception):
+            raise future
+        return mesh_response(future.result(), stage, len(glb_bytes))
+    except Exception as e:
+        return error_response(pb_utils, e)
 
-        class InferenceResponse:
-            def __call__(self, *args, **kwds):
-                pass
 
-        class Tensor:
-            def __call__(self, *args, **kwds):
-                pass
+def move_texture_pipeline(pipeline, device: str):
+    # Step1X3DTexturePipeline is a plain object holding diffusers pipelines and torch modules
+    import torch
+    from diffusers import DiffusionPipeline
+
+    for value in vars(pipeline).values():
+        if isinstance(value, (torch.nn.Module, DiffusionPipeline)):
+            value.to(device)
 
 
 class TritonPythonModel:
     def initialize(self, args):
-        self._geo_pipeline = Step1X3DGeometryPipeline.from_pretrained(
-            "stepfun-ai/Step1X-3D", subfolder="Step1X-3D-Geometry-1300m"
-        ).to("cuda")
-        self._texture_pipeline = Step1X3DTexturePipeline.from_pretrained(
-            "stepfun-ai/Step1X-3D", subfolder="Step1X-3D-Texture"
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self._decoupled = pb_utils.using_decoupled_model_transaction_policy(model_config)
+        self._metrics = ModelMetrics(pb_utils, model_config.get("name", "step1x-3d"))
+
+        # The geometry pipeline stays resident. The texture pipeline is loaded on first use and
+        # offloaded or unloaded again once idle or above the device memory ceiling, so geometry-only
+        # traffic does not hold it; texture_preload loads both side by side up front
+        self._model_path = local_model_path(parameters.get("model_dir", ""), "stepfun-ai/Step1X-3D")
+        preload_texture = parameters.get("texture_preload", "false").lower() == "true"
+        loaders = {"geometry": self._load_geometry, "texture": self._load_texture}
+        components = load_components(loaders if preload_texture else {"geometry": self._load_geometry})
+        self._geo_pipeline = components["geometry"]
+        self._texture_pipeline = LazyComponent(
+            "texture",
+            self._load_texture,
+            self._metrics,
+            offload=parameters.get("texture_offload", "cpu"),
+            move=move_texture_pipeline,
+            idle_seconds=float(parameters.get("texture_idle_seconds", 300)),
+            device_memory_limit_bytes=int(parameters.get("texture_device_memory_limit_mb", 0)) * 2**20,
+            host_memory_limit_bytes=int(parameters.get("texture_host_memory_limit_mb", 0)) * 2**20,
+        )
+        if preload_texture:
+            self._texture_pipeline.adopt(components["texture"])
+
+        # Everything that changes the generated mesh is part of the cache key
+        self._default_quality = parameters.get("default_quality", "high")
+        self._default_mesh_format = parameters.get("default_mesh_format", "glb")
+        self._fixed_params = {
+            "geometry_model": "stepfun-ai/Step1X-3D/Step1X-3D-Geometry-1300m",
+            "texture_model": "stepfun-ai/Step1X-3D/Step1X-3D-Texture",
+            "seed": 2025,
+        }
+        self._cache = ResultCache(
+            parameters.get("cache_dir", ""),
+            max_memory_bytes=int(parameters.get("cache_memory_mb", 512)) * 2**20,
+            max_disk_bytes=int(parameters.get("cache_disk_mb", 10240)) * 2**20,
+        )
+
+        # Uploads are decoded straight at the working resolution; larger ones than the
+        # byte and pixel limits are rejected before the GPU sees them
+        self._input_max_side = int(parameters.get("input_max_side", 1024))
+        self._input_max_bytes = int(parameters.get("input_max_mb", 20)) * 2**20
+        self._input_max_pixels = int(float(parameters.get("input_max_megapixels", 50)) * 1e6)
+
+        # Pipelines listed here get the input image as a file path instead of a PIL image
+        self._path_inputs = {p.strip() for p in parameters.get("path_inputs", "").split(",") if p.strip()}
+
+        # Output compression runs here, so the GPU moves on to the next request meanwhile
+        self._encoder = ThreadPoolExecutor(
+            max_workers=int(parameters.get("encode_workers", 2)), thread_name_prefix="glb-encode"
         )
 
+        # Geometry, cleanup, texture and encoding of the bundled image with the default preset,
+        # a few diffusion steps each; the result cache is bypassed. The texture stage is only
+        # warmed up when preloaded, otherwise the first textured request pays for load and warmup
+        self._warmup_steps = int(parameters.get("warmup_num_inference_steps", 5))
+        self._warmup_texture = preload_texture
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self._metrics)
+
     def execute(self, requests):
+        start = time.time()
+        self._metrics.observe_batch("execute", len(requests))
+        encoded = []
+
+        for request in requests:
+            if self._decoupled:
+                self._stream(request)
+                continue
+
+            # 1. Get input tensor
+            input_tensor = pb_utils.get_input_tensor_by_name(request, "image")
+            image_bytes = input_tensor.as_numpy().squeeze()  # np.object_ 배열
+            logging.info(f"image_bytes type: {type(image_bytes)}")
+            try:
+                params, output = self._params(request), self._output_format(request)
+            except ValueError as e:
+                encoded.append((None, e))
+                continue
+
+            # 2. Generate, unless this image is already cached, and compress in the background.
+            #    Requests cancelled meanwhile stop at the next stage or denoising step; a
+            #    request that fails, e.g. on an upload over the input limits, fails alone
+            try:
+                glb_bytes = self._generate_cached(image_bytes.item(), params, is_cancelled=request.is_cancelled)
+            except Exception as e:
+                if isinstance(e, RequestCancelled):
+                    count_cancelled(self._metrics, e.stage)
+                elif not isinstance(e, ValueError):
+                    logging.exception("Generation failed")
+                encoded.append((None, e))
+                continue
+            encoded.append((glb_bytes, self._encoder.submit(self._compress, glb_bytes, output)))
+
+        # 3. Collect the compressed meshes
+        responses = [encoded_response(glb_bytes, future) for glb_bytes, future in encoded]
+
+        self._metrics.observe("execute", time.time() - start)
+        logging.info(f"Latency : {time.time() - start} sec")
+        logging.info(f"Cache : {self._cache.format_stats()}")
+        return None if self._decoupled else responses
+
+    def finalize(self):
+        self._encoder.shutdown()
+        self._texture_pipeline.close()
+
+    def _warmup(self, batch_size: int):
+        params = {**QUALITY_PRESETS[self._default_quality], "num_inference_steps": self._warmup_steps}
+        params["texture"] = params["texture"] and self._warmup_texture
+        for _ in range(batch_size):
+            glb_bytes = self._generate(warmup_image_bytes(), params)
+            self._compress(glb_bytes, MESH_FORMATS[self._default_mesh_format])
+
+    def _load_geometry(self):
+        from step1x3d_geometry.models.pipelines.pipeline import Step1X3DGeometryPipeline
+
+        pipeline = Step1X3DGeometryPipeline.from_pretrained(self._model_path, subfolder="Step1X-3D-Geometry-1300m")
+        return pipeline.to("cuda")
+
+    def _load_texture(self):
+        from step1x3d_texture.pipelines.step1x_3d_texture_synthesis_pipeline import (
+            Step1X3DTexturePipeline,
+        )
+
+        return Step1X3DTexturePipeline.from_pretrained(self._model_path, subfolder="Step1X-3D-Texture")
+
+    def _params(self, request) -> dict:
+        return resolve_params(
+            request, pb_utils.get_input_tensor_by_name, QUALITY_PRESETS, self._default_quality, bounds=PARAM_BOUNDS
+        )
+
+    def _output_format(self, request) -> dict:
+        return resolve_params(
+            request, pb_utils.get_input_tensor_by_name, MESH_FORMATS, self._default_mesh_format, selector="mesh_format"
+        )
+
+    def _stream(self, request):
+        # Decoupled mode: the untextured mesh goes out as soon as it is cleaned,
+        # the textured mesh follows as the final response
+        sender = request.get_response_sender()
+        try:
+            image_bytes = pb_utils.get_input_tensor_by_name(request, "image").as_numpy().squeeze()
+            params, output = self._params(request), self._output_format(request)
+            # Geometry-only requests have nothing to preview, the final mesh is the untextured one
+            on_geometry = (lambda glb: sender.send(mesh_response(glb, "geometry"))) if params["texture"] else None
+            glb_bytes = self._generate_cached(image_bytes.item(), params, on_geometry, request.is_cancelled)
+        except Exception as e:
+            if isinstance(e, RequestCancelled):
+                count_cancelled(self._metrics, e.stage)
+            elif not isinstance(e, ValueError):
+                logging.exception("Generation failed")
+            sender.send(error_response(pb_utils, e), flags=pb_utils.TRITONSERVER_RESPONSE_COMPLETE_FINAL)
+            return
+
+        # The final response goes out from the encoder thread once the mesh is compressed
+        future = self._encoder.submit(self._compress, glb_bytes, output)
+        future.add_done_callback(
+            lambda f: sender.send(
+                encoded_response(glb_bytes, f, "textured"), flags=pb_utils.TRITONSERVER_RESPONSE_COMPLETE_FINAL
+            )
+        )
+
+    def _generate_cached(
+        self,
+        image_bytes: bytes,
+        params: dict,
+        on_geometry: Optional[Callable[[bytes], None]] = None,
+        is_cancelled: Callable[[], bool] = lambda: False,
+    ) -> bytes:
+        key = ResultCache.key(image_bytes, **self._fixed_params, **params)
+        glb_bytes = self._cache.get(key)
+        if glb_bytes is None:
+            glb_bytes = self._generate(image_bytes, params, on_geometry, is_cancelled)
+            self._cache.put(key, glb_bytes)
+        return glb_bytes
+
+    def _generate(
+        self,
+        image_bytes: bytes,
+        params: dict,
+        on_geometry: Optional[Callable[[bytes], None]] = None,
+        is_cancelled: Callable[[], bool] = lambda: False,
+    ) -> bytes:
+        # is_cancelled is polled before each stage and after every geometry denoising step;
+        # once it is true RequestCancelled ends the generation
+        import torch
+
         try:
-            start = time.time()
-            responses = []
-
-            for request in requests:
-                # 1. Get input tensor
-                input_tensor = pb_utils.get_input_tensor_by_name(request, "image")
-                image_bytes = input_tensor.as_numpy().squeeze()  # np.object_ 배열
-                logging.info(f"image_bytes type: {type(image_bytes)}")
-                image = Image.open(io.BytesIO(image_bytes.item())).convert("RGBA")
-                filename = f"{uuid.uuid4()}.png"
-                image.save(filename)
+            with self._metrics.time("decode"):
+                image = decode_image(
+                    image_bytes,
+                    self._input_max_side,
+                    self._input_max_bytes,
+                    self._input_max_pixels,
+                    metrics=self._metrics,
+                )
+        except ValueError:
+            self._metrics.increment("input_rejected")
+            raise
 
+        with Workdir() as workdir:
+            # 1. Geometry
+            raise_if_cancelled(is_cancelled, "geometry")
+            with self._metrics.time("geometry"):
                 generator = torch.Generator(device=self._geo_pipeline.device)
-                generator.manual_seed(2025)
-                out = self._geo_pipeline(filename, guidance_scale=7.5, num_inference_steps=50, generator=generator)
-                glb_filename = f"{filename.split('.')[0]}.glb"
-                out.mesh[0].export(glb_filename)
-
-                mesh = trimesh.load(glb_filename)
-                mesh = remove_degenerate_face(mesh)
-                mesh = reduce_face(mesh)
-
-                textured_mesh = self._texture_pipeline(filename, mesh, seed=2025)
-                textured_mesh.export(glb_filename)
-
-                with open(glb_filename, "rb") as f:
-                    glb_bytes = f.read()
-                    mesh_tensor = pb_utils.Tensor("mesh", np.array([glb_bytes], dtype=object))
-                    inference_response = pb_utils.InferenceResponse(output_tensors=[mesh_tensor])
-                    responses.append(inference_response)
-
-            logging.info(f"Latency : {time.time() - start} sec")
-            return responses
-
-        finally:
-            os.remove(filename)
-            os.remove(glb_filename)
+                generator.manual_seed(self._fixed_params["seed"])
+                out = self._geo_pipeline(
+                    self._image_input(image, "geometry", workdir),
+                    guidance_scale=params["guidance_scale"],
+                    num_inference_steps=params["num_inference_steps"],
+                    generator=generator,
+                    **step_callback_kwargs(self._geo_pipeline, is_cancelled, "geometry"),
+                )
+
+            # 2. Clean the trimesh in memory
+            with self._metrics.time("cleanup"):
+                mesh = clean_trimesh(out.mesh[0], params["face_budget"])
+            if not params["texture"]:
+                return self._export(mesh)
+            if on_geometry is not None:
+                on_geometry(self._export(mesh))
+
+            # 3. Texture
+            raise_if_cancelled(is_cancelled, "texture")
+            with self._texture_pipeline.use() as texture_pipeline, self._metrics.time("texture"):
+                mesh = texture_pipeline(
+                    self._image_input(image, "texture", workdir), mesh, seed=self._fixed_params["seed"]
+                )
+
+        # 4. Encode the GLB once, straight into memory
+        return self._export(mesh)
+
+    def _export(self, mesh) -> bytes:
+        with self._metrics.time("export"):
+            return mesh.export(file_type="glb")
+
+    def _compress(self, glb_bytes: bytes, output: dict) -> bytes:
+        with self._metrics.time("encode"):
+            return compress_glb(glb_bytes, **output)
+
+    def _image_input(self, image: Image.Image, pipeline: str, workdir: Workdir):
+        if pipeline not in self._path_inputs:
+            return image
+        path = workdir.path("input.png")
+        if not os.path.exists(path):
+            image.save(path)
+        return path
@@ -0,0 +1,108 @@
+from PIL import Image
+from triton_common.metrics import ModelMetrics
+from triton_common.warmup import execute_requests, run_warmup, warmup_batch_sizes
+
+import numpy as np
+import io, json, logging, time
+
+logging.basicConfig(level=logging.INFO)
+
+try:
+    import triton_python_backend_utils as pb_utils
+except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+OUTPUTS = ["mask", "class_confidence", "mask_png"]
+
+
+def palette(num_classes: int) -> list[int]:
+    # PASCAL VOC colormap: the bits of the class index spread over R, G and B
+    colors = []
+    for index in range(256):
+        r = g = b = 0
+        c = index
+        for shift in range(7, -1, -1):
+            r |= (c & 1) << shift
+            g |= ((c >> 1) & 1) << shift
+            b |= ((c >> 2) & 1) << shift
+            c >>= 3
+        colors += [r, g, b] if index < num_classes else [0, 0, 0]
+    return colors
+
+
+def encode_png(mask: np.ndarray, colors: list[int]) -> bytes:
+    image = Image.fromarray(mask)
+    image.putpalette(colors)  # "L" becomes "P", the class indices stay as they are
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TritonPythonModel:
+    # unet logits in, argmax class mask out, with per-class confidences and a palette
+    # PNG of the mask when they are requested. A dynamic batch is reduced in one go.
+    def initialize(self, args):
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.model_name = model_config.get("name", "unet_postprocess")
+        self.metrics = ModelMetrics(pb_utils, self.model_name)
+
+        logits = next(entry for entry in model_config["input"] if entry["name"] == "logits")
+        self.logits_shape = tuple(int(dim) for dim in logits["dims"])
+        self.num_classes = self.logits_shape[0]
+        if self.num_classes > 256:
+            raise ValueError(f"A uint8 mask holds at most 256 classes, the logits have {self.num_classes}")
+        self.palette = palette(self.num_classes)
+
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self.metrics)
+
+    def execute(self, requests):
+        start = time.time()
+        self.metrics.observe_batch("execute", len(requests))
+
+        # 1. One array for the batch, [images, classes, height, width]
+        logits = [pb_utils.get_input_tensor_by_name(request, "logits").as_numpy() for request in requests]
+        counts = [len(array) for array in logits]
+        batch = np.concatenate(logits) if len(logits) > 1 else logits[0]
+        wanted = set()
+        for request in requests:
+            wanted.update(request.requested_output_names() or OUTPUTS)
+
+        # 2. Argmax over the classes; the winning class' softmax probability is
+        #    1 / sum(exp(logit - max)) and needs no full softmax
+        with self.metrics.time("argmax", batch_size=len(batch)):
+            masks = batch.argmax(axis=1).astype(np.uint8)
+        if "class_confidence" in wanted:
+            with self.metrics.time("confidence", batch_size=len(batch)):
+                peak = batch.max(axis=1, keepdims=True)
+                probability = 1.0 / np.exp(batch - peak).sum(axis=1)
+                confidences = np.zeros((len(batch), self.num_classes), dtype=np.float32)
+                for i, (mask, p) in enumerate(zip(masks, probability)):
+                    pixels = np.bincount(mask.ravel(), minlength=self.num_classes)
+                    totals = np.bincount(mask.ravel(), weights=p.ravel(), minlength=self.num_classes)
+                    confidences[i] = np.divide(totals, pixels, out=np.zeros_like(totals), where=pixels > 0)
+        if "mask_png" in wanted:
+            with self.metrics.time("png", batch_size=len(batch)):
+                pngs = np.array([[encode_png(mask, self.palette)] for mask in masks], dtype=object)
+
+        # 3. Each request gets its slice of the batch
+        responses = []
+        offset = 0
+        for request, count in zip(requests, counts):
+            names = request.requested_output_names() or OUTPUTS
+            images = slice(offset, offset + count)
+            offset += count
+            output_tensors = [pb_utils.Tensor("mask", masks[images])]
+            if "class_confidence" in names:
+                output_tensors.append(pb_utils.Tensor("class_confidence", confidences[images]))
+            if "mask_png" in names:
+                output_tensors.append(pb_utils.Tensor("mask_png", pngs[images]))
+            responses.append(pb_utils.InferenceResponse(output_tensors=output_tensors))
+
+        logging.info(f"unet_postprocess : {len(batch)} images, Latency : {time.time() - start} sec")
+        return responses
+
+    def _warmup(self, batch_size: int):
+        logits = np.random.default_rng(0).standard_normal(self.logits_shape, dtype=np.float32)
+        execute_requests(pb_utils, self, [{"logits": logits[np.newaxis]}] * batch_size, OUTPUTS)
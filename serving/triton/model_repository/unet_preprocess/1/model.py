@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from triton_common.cancellation import error_response
+from triton_common.images import decode_image
+from triton_common.metrics import ModelMetrics
+from triton_common.warmup import execute_requests, run_warmup, warmup_batch_sizes, warmup_image_bytes
+
+import numpy as np
+import json, logging, time
+
+logging.basicConfig(level=logging.INFO)
+
+try:
+    import triton_python_backend_utils as pb_utils
+except ImportError:
+    # Same API outside Triton, see triton_common.offline
+    from triton_common.offline import pb_utils
+
+
+def floats(text: str) -> np.ndarray:
+    return np.array([float(value) for value in text.split(",")], dtype=np.float32)
+
+
+class TritonPythonModel:
+    # Encoded image in, normalized NCHW FP32 unet input out. The images of a dynamic
+    # batch are decoded on a thread pool and normalized as one array.
+    def initialize(self, args):
+        model_config = json.loads(args["model_config"])
+        parameters = {k: v["string_value"] for k, v in model_config.get("parameters", {}).items()}
+        self.model_name = model_config.get("name", "unet_preprocess")
+        self.metrics = ModelMetrics(pb_utils, self.model_name)
+
+        output = next(entry for entry in model_config["output"] if entry["name"] == "input")
+        _, self.height, self.width = (int(dim) for dim in output["dims"])
+        self.mean = floats(parameters.get("mean", "0.485,0.456,0.406"))
+        self.std = floats(parameters.get("std", "0.229,0.224,0.225"))
+        self.input_max_bytes = int(float(parameters.get("input_max_mb", 20)) * 2**20)
+        self.input_max_pixels = int(float(parameters.get("input_max_megapixels", 50)) * 1e6)
+        self.pool = ThreadPoolExecutor(max_workers=int(parameters.get("decode_threads", 4)))
+
+        run_warmup(self._warmup, warmup_batch_sizes(model_config, parameters), self.metrics)
+
+    def execute(self, requests):
+        start = time.time()
+        self.metrics.observe_batch("execute", len(requests))
+
+        # 1. Decode and resize every image of the batch; an image that does not decode
+        #    or is over a limit fails its own request only
+        encoded = [pb_utils.get_input_tensor_by_name(request, "image").as_numpy().reshape(-1) for request in requests]
+        items = [item for images in encoded for item in images]
+        with self.metrics.time("decode", batch_size=len(items)):
+            decoded = list(self.pool.map(self._decode, items))
+
+        # 2. uint8 HWC to normalized NCHW in one go for the images that decoded
+        pixels = [image for image in decoded if not isinstance(image, Exception)]
+        if pixels:
+            with self.metrics.time("normalize", batch_size=len(pixels)):
+                normalized = (np.stack(pixels).astype(np.float32) / 255.0 - self.mean) / self.std
+                normalized = np.ascontiguousarray(normalized.transpose(0, 3, 1, 2))
+
+        # 3. Each request gets its slice of the batch
+        responses = []
+        index = offset = 0
+        for images in encoded:
+            results = decoded[index : index + len(images)]
+            index += len(images)
+            error = next((result for result in results if isinstance(result, Exception)), None)
+            if error is not None:
+                responses.append(error_response(pb_utils, error))
+                offset += sum(not isinstance(result, Exception) for result in results)
+                continue
+            output_tensors = [pb_utils.Tensor("input", normalized[offset : offset + len(images)])]
+            offset += len(images)
+            responses.append(pb_utils.InferenceResponse(output_tensors=output_tensors))
+
+        logging.info(f"unet_preprocess : {len(items)} images, Latency : {time.time() - start} sec")
+        return responses
+
+    def finalize(self):
+        self.pool.shutdown()
+
+    def _decode(self, data: bytes):
+        # HWC uint8 RGB at the network's size, or the exception that stopped it: raised
+        # on a pool thread, it would fail every request of the batch
+        try:
+            image = decode_image(data, 0, self.input_max_bytes, self.input_max_pixels, mode="RGB", metrics=self.metrics)
+            return np.asarray(image.resize((self.width, self.height), Image.Resampling.BILINEAR), dtype=np.uint8)
+        except Exception as e:
+            if not isinstance(e, ValueError):
+                logging.exception("Decoding failed")
+            self.metrics.increment("input_rejected")
+            return e
+
+    def _warmup(self, batch_size: int):
+        inputs = {"image": np.array([[warmup_image_bytes()]], dtype=object)}
+        execute_requests(pb_utils, self, [inputs] * batch_size, ["input"])
@@ -0,0 +1,156 @@
+"""Content-addressed result cache with an in-memory tier and an on-disk tier.
+
+Both tiers evict least-recently-used entries once their byte budget is
+exceeded. Disk entries survive restarts; the disk index is rebuilt from file
+modification times on start-up.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResultCache:
+    def __init__(self, directory: Optional[str], max_memory_bytes: int, max_disk_bytes: int):
+        self.directory = directory or None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.directory and self.max_disk_bytes > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_disk_index()
+
+    @staticmethod
+    def key(data: bytes, **params) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            on_disk = key in self._disk
+
+        value = self._read_disk(key) if on_disk else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._put_memory(key, value)
+            return value
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._put_memory(key, value)
+        self._write_disk(key, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (
+            f"hits={s['hits']} (disk={s['disk_hits']}) misses={s['misses']} "
+            f"memory={s['memory_bytes'] / 2**20:.1f}MB disk={s['disk_bytes'] / 2**20:.1f}MB"
+        )
+
+    def _put_memory(self, key: str, value: bytes):
+        if len(value) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load_disk_index(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if len(name) == 64:
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return value
+
+    def _write_disk(self, key: str, value: bytes):
+        if not self.directory or len(value) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            logging.exception(f"Failed to write cache entry {key}")
+            return
+        with self._lock:
+            self._disk_bytes += len(value) - self._disk.pop(key, 0)
+            self._disk[key] = len(value)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
@@ -0,0 +1,69 @@
+"""Abandoning the work of requests whose client has given up.
+
+Triton marks a request cancelled when its client cancels it or disconnects;
+the backend has to poll request.is_cancelled(). The models do so through
+is_cancelled() below, which never asks the warmup requests a model builds
+itself, between their stages and, through the diffusion pipelines' step
+callbacks, after every denoising step, and raise RequestCancelled to drop the
+rest.
+"""
+
+import inspect
+from typing import Callable
+
+from triton_common.warmup import is_warmup_request
+
+
+class RequestCancelled(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Request cancelled by the client before {stage}")
+        self.stage = stage
+
+
+def is_cancelled(request) -> bool:
+    # Only requests Triton delivered are tracked by it; warmup requests never are
+    return not is_warmup_request(request) and request.is_cancelled()
+
+
+def raise_if_cancelled(is_cancelled: Callable[[], bool], stage: str):
+    if is_cancelled():
+        raise RequestCancelled(stage)
+
+
+def count_cancelled(metrics, stage: str, count: int = 1):
+    # model_events_total{event="cancelled"} and, for where the work stopped, {event="cancelled_<stage>"}
+    metrics.increment("cancelled", count)
+    metrics.increment(f"cancelled_{stage}", count)
+
+
+def step_callback(is_cancelled: Callable[[], bool], stage: str) -> Callable:
+    # The older callback(step, timestep, latents) convention
+    def on_step(step, timestep, latents):
+        raise_if_cancelled(is_cancelled, stage)
+
+    return on_step
+
+
+def step_callback_kwargs(pipeline, is_cancelled: Callable[[], bool], stage: str) -> dict:
+    # Keyword arguments that make a pipeline call check is_cancelled() after every step:
+    # diffusers' callback_on_step_end, the older callback, or none when it takes neither
+    parameters = inspect.signature(pipeline.__call__).parameters
+    if "callback_on_step_end" in parameters:
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            raise_if_cancelled(is_cancelled, stage)
+            return callback_kwargs
+
+        return {"callback_on_step_end": on_step_end}
+    if "callback" in parameters:
+        return {"callback": step_callback(is_cancelled, stage)}
+    return {}
+
+
+def error_response(pb_utils, error: Exception):
+    # Cancellations carry Triton's CANCELLED code, everything else the default
+    if isinstance(error, RequestCancelled):
+        return pb_utils.InferenceResponse(
+            output_tensors=[], error=pb_utils.TritonError(str(error), pb_utils.TritonError.CANCELLED)
+        )
+    return pb_utils.InferenceResponse(output_tensors=[], error=pb_utils.TritonError(str(error)))
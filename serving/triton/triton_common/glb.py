@@ -0,0 +1,460 @@
+"""Size-reducing GLB transcoder.
+
+Rewrites a binary glTF into a smaller one without touching the mesh topology:
+
+- geometry "quantize" stores positions as int16, normals as int8 and texture
+  coordinates as uint16 (KHR_mesh_quantization); the position dequantization
+  is a scale/translation on a child node of every node using the mesh,
+- geometry "meshopt" additionally reorders triangles and vertices for locality
+  and compresses vertex and index streams with the meshoptimizer codecs
+  (EXT_meshopt_compression), falling back to "quantize" when the meshoptimizer
+  package is not installed,
+- embedded textures are downscaled to texture_size and re-encoded as JPEG or
+  WebP (EXT_texture_webp); textures with transparency stay PNG. A WebP texture
+  keeps a JPEG or PNG copy as its core source, so loaders without WebP support
+  still read the file.
+"""
+
+import io
+import json
+import logging
+import struct
+from typing import Optional
+
+import numpy as np
+
+# Per-request output formats; texture_size 0 keeps the original resolution
+MESH_FORMATS = {
+    "glb": {"geometry": "none", "texture_format": "keep", "texture_size": 0, "texture_quality": 90},
+    "quantized": {"geometry": "quantize", "texture_format": "jpeg", "texture_size": 2048, "texture_quality": 90},
+    "compressed": {"geometry": "meshopt", "texture_format": "webp", "texture_size": 1024, "texture_quality": 80},
+}
+
+_GLB_MAGIC = 0x46546C67
+_JSON_CHUNK = 0x4E4F534A
+_BIN_CHUNK = 0x004E4942
+
+_COMPONENT_DTYPES = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+_DTYPE_COMPONENTS = {np.dtype(v): k for k, v in _COMPONENT_DTYPES.items()}
+_TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+_TRIANGLES = 4
+
+
+def compress_glb(
+    glb: bytes,
+    geometry: str = "quantize",
+    texture_format: str = "jpeg",
+    texture_size: int = 0,
+    texture_quality: int = 90,
+) -> bytes:
+    if geometry not in ("none", "quantize", "meshopt"):
+        raise ValueError(f"Unknown geometry compression '{geometry}', expected none, quantize or meshopt")
+    if texture_format not in ("keep", "png", "jpeg", "webp"):
+        raise ValueError(f"Unknown texture format '{texture_format}', expected keep, png, jpeg or webp")
+    if geometry == "meshopt" and _meshopt() is None:
+        logging.warning("meshoptimizer is not installed, falling back to quantized geometry")
+        geometry = "quantize"
+    if geometry == "none" and texture_format == "keep" and texture_size <= 0:
+        return glb
+
+    doc, binary = _read_glb(glb)
+    return _Transcoder(doc, binary, geometry, texture_format, texture_size, texture_quality).run()
+
+
+def _read_glb(glb: bytes) -> tuple[dict, bytes]:
+    magic, version, length = struct.unpack_from("<III", glb, 0)
+    if magic != _GLB_MAGIC or version != 2:
+        raise ValueError("Not a glTF 2.0 binary")
+    doc, binary, offset = None, b"", 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from("<II", glb, offset)
+        chunk = glb[offset + 8 : offset + 8 + chunk_length]
+        if chunk_type == _JSON_CHUNK:
+            doc = json.loads(chunk)
+        elif chunk_type == _BIN_CHUNK:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+    if doc is None:
+        raise ValueError("GLB has no JSON chunk")
+    return doc, binary
+
+
+def _write_glb(doc: dict, binary: bytes) -> bytes:
+    json_chunk = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(json_chunk) + (8 + len(binary) if binary else 0)
+    out = [struct.pack("<III", _GLB_MAGIC, 2, length), struct.pack("<II", len(json_chunk), _JSON_CHUNK), json_chunk]
+    if binary:
+        out += [struct.pack("<II", len(binary), _BIN_CHUNK), binary]
+    return b"".join(out)
+
+
+def _meshopt():
+    try:
+        import meshoptimizer
+    except ImportError:
+        return None
+    # EXT_meshopt_compression only accepts version 0 vertex streams
+    meshoptimizer.encode_vertex_version(0)
+    return meshoptimizer
+
+
+def _is_quantized(name: str) -> bool:
+    return name in ("POSITION", "NORMAL") or name.startswith("TEXCOORD_")
+
+
+def _pad_columns(array: np.ndarray) -> np.ndarray:
+    # Vertex attribute elements have to start on 4-byte boundaries
+    row_bytes = array.shape[1] * array.itemsize
+    padding = -row_bytes % 4 // array.itemsize
+    if padding:
+        array = np.concatenate([array, np.zeros((len(array), padding), dtype=array.dtype)], axis=1)
+    return np.ascontiguousarray(array)
+
+
+class _Transcoder:
+    def __init__(self, doc: dict, binary: bytes, geometry: str, texture_format: str, size: int, quality: int):
+        self.doc = doc
+        self.binary = binary
+        self.geometry = geometry
+        self.texture_format = texture_format
+        self.texture_size = size
+        self.texture_quality = quality
+
+        self.chunks: list[bytes] = []
+        self.offset = 0
+        self.fallback_bytes = 0
+        self.buffer_views: list[dict] = []
+        self.accessors: list[dict] = []
+        self.copied_views: dict[int, int] = {}
+        self.copied_accessors: dict[int, int] = {}
+        self.extensions: set[str] = set()
+        self.optional_extensions: set[str] = set()
+
+    def run(self) -> bytes:
+        doc = self.doc
+        quantized_meshes = self._quantizable_meshes() if self.geometry != "none" else set()
+        dequantize = {}
+        for index, mesh in enumerate(doc.get("meshes", [])):
+            if index in quantized_meshes:
+                dequantize[index] = self._rewrite_mesh(mesh)
+            else:
+                for primitive in mesh.get("primitives", []):
+                    self._keep_primitive(primitive)
+        for skin in doc.get("skins", []):
+            if "inverseBindMatrices" in skin:
+                skin["inverseBindMatrices"] = self._keep_accessor(skin["inverseBindMatrices"])
+        for animation in doc.get("animations", []):
+            for sampler in animation.get("samplers", []):
+                sampler["input"] = self._keep_accessor(sampler["input"])
+                sampler["output"] = self._keep_accessor(sampler["output"])
+
+        self._rewrite_images()
+        self._attach_dequantization(dequantize)
+
+        doc["accessors"] = self.accessors
+        doc["bufferViews"] = self.buffer_views
+        doc["buffers"] = [{"byteLength": self.offset}]
+        if self.fallback_bytes:
+            # The uncompressed views point into a buffer that only exists for loaders without the extension
+            doc["buffers"].append(
+                {"byteLength": self.fallback_bytes, "extensions": {"EXT_meshopt_compression": {"fallback": True}}}
+            )
+        for key in ("accessors", "bufferViews"):
+            if not doc[key]:
+                del doc[key]
+        if self.extensions or self.optional_extensions:
+            used = self.extensions | self.optional_extensions
+            doc["extensionsUsed"] = sorted(set(doc.get("extensionsUsed", [])) | used)
+        if self.extensions:
+            doc["extensionsRequired"] = sorted(set(doc.get("extensionsRequired", [])) | self.extensions)
+        return _write_glb(doc, b"".join(self.chunks))
+
+    # Buffer building
+
+    def _append(self, data: bytes) -> int:
+        padding = -self.offset % 4
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.offset += padding
+        offset = self.offset
+        self.chunks.append(data)
+        self.offset += len(data)
+        return offset
+
+    def _add_view(self, data: bytes, stride: Optional[int] = None, target: Optional[int] = None) -> int:
+        view = {"buffer": 0, "byteOffset": self._append(data), "byteLength": len(data)}
+        if stride is not None:
+            view["byteStride"] = stride
+        if target is not None:
+            view["target"] = target
+        self.buffer_views.append(view)
+        return len(self.buffer_views) - 1
+
+    def _add_compressed_view(self, array: np.ndarray, mode: str, target: int) -> int:
+        meshopt = _meshopt()
+        if mode == "TRIANGLES":
+            stride = array.itemsize
+            encoded = meshopt.encode_index_buffer(array.astype(np.uint32), vertex_count=int(array.max()) + 1)
+        else:
+            stride = array.shape[1] * array.itemsize
+            encoded = meshopt.encode_vertex_buffer(array.view(np.uint8).reshape(len(array), stride))
+        offset = self._append(encoded)
+        view = {
+            "buffer": 1,
+            "byteOffset": self.fallback_bytes,
+            "byteLength": array.nbytes,
+            "target": target,
+            "extensions": {
+                "EXT_meshopt_compression": {
+                    "buffer": 0,
+                    "byteOffset": offset,
+                    "byteLength": len(encoded),
+                    "byteStride": stride,
+                    "mode": mode,
+                    "count": len(array),
+                }
+            },
+        }
+        if mode == "ATTRIBUTES":
+            view["byteStride"] = stride
+        self.fallback_bytes += array.nbytes + (-array.nbytes % 4)
+        self.extensions.add("EXT_meshopt_compression")
+        self.buffer_views.append(view)
+        return len(self.buffer_views) - 1
+
+    def _add_accessor(self, accessor: dict) -> int:
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    # Copying untouched data
+
+    def _view_bytes(self, index: int) -> bytes:
+        view = self.doc["bufferViews"][index]
+        if view.get("buffer", 0) != 0:
+            raise ValueError("Only GLBs with a single embedded buffer are supported")
+        start = view.get("byteOffset", 0)
+        return self.binary[start : start + view["byteLength"]]
+
+    def _keep_view(self, index: int) -> int:
+        if index not in self.copied_views:
+            view = dict(self.doc["bufferViews"][index])
+            view["byteOffset"] = self._append(self._view_bytes(index))
+            view["buffer"] = 0
+            self.buffer_views.append(view)
+            self.copied_views[index] = len(self.buffer_views) - 1
+        return self.copied_views[index]
+
+    def _keep_accessor(self, index: int) -> int:
+        if index not in self.copied_accessors:
+            accessor = json.loads(json.dumps(self.doc["accessors"][index]))
+            if "bufferView" in accessor:
+                accessor["bufferView"] = self._keep_view(accessor["bufferView"])
+            sparse = accessor.get("sparse")
+            if sparse is not None:
+                sparse["indices"]["bufferView"] = self._keep_view(sparse["indices"]["bufferView"])
+                sparse["values"]["bufferView"] = self._keep_view(sparse["values"]["bufferView"])
+            self.copied_accessors[index] = self._add_accessor(accessor)
+        return self.copied_accessors[index]
+
+    def _keep_primitive(self, primitive: dict):
+        primitive["attributes"] = {k: self._keep_accessor(v) for k, v in primitive["attributes"].items()}
+        if "indices" in primitive:
+            primitive["indices"] = self._keep_accessor(primitive["indices"])
+        for target in primitive.get("targets", []):
+            for name in target:
+                target[name] = self._keep_accessor(target[name])
+
+    def _read_accessor(self, index: int, as_float: bool = False) -> np.ndarray:
+        accessor = self.doc["accessors"][index]
+        if "bufferView" not in accessor or "sparse" in accessor:
+            raise ValueError("Sparse or empty accessors are not supported")
+        dtype = np.dtype(_COMPONENT_DTYPES[accessor["componentType"]])
+        width = _TYPE_SIZES[accessor["type"]]
+        view = self.doc["bufferViews"][accessor["bufferView"]]
+        stride = view.get("byteStride", dtype.itemsize * width)
+        array = np.ndarray(
+            (accessor["count"], width),
+            dtype=dtype,
+            buffer=self.binary,
+            offset=view.get("byteOffset", 0) + accessor.get("byteOffset", 0),
+            strides=(stride, dtype.itemsize),
+        )
+        if not as_float:
+            return array.copy()
+        if accessor.get("normalized") and dtype.kind in "iu":
+            return np.maximum(array.astype(np.float64) / np.iinfo(dtype).max, -1.0)
+        return array.astype(np.float64)
+
+    # Geometry
+
+    def _quantizable_meshes(self) -> set[int]:
+        # Skinned and morphed meshes keep float geometry, their accessors have other users
+        excluded = {node["mesh"] for node in self.doc.get("nodes", []) if "mesh" in node and "skin" in node}
+        meshes = set()
+        for index, mesh in enumerate(self.doc.get("meshes", [])):
+            primitives = mesh.get("primitives", [])
+            if index in excluded or any("targets" in p or "POSITION" not in p["attributes"] for p in primitives):
+                continue
+            if any(self.doc["accessors"][p["attributes"]["POSITION"]].get("sparse") for p in primitives):
+                continue
+            meshes.add(index)
+        return meshes
+
+    def _rewrite_mesh(self, mesh: dict) -> tuple[list[float], float]:
+        primitives = mesh["primitives"]
+        positions = [self._read_accessor(p["attributes"]["POSITION"], as_float=True) for p in primitives]
+        lower = np.min([p.min(axis=0) for p in positions], axis=0)
+        upper = np.max([p.max(axis=0) for p in positions], axis=0)
+        center = (lower + upper) / 2
+        # Uniform scale, so normals stay valid under the dequantization transform
+        scale = max(float((upper - lower).max()) / 2, 1e-12) / 32767
+
+        for primitive, position in zip(primitives, positions):
+            attributes = {
+                name: self._read_accessor(index, as_float=_is_quantized(name))
+                for name, index in primitive["attributes"].items()
+            }
+            attributes["POSITION"] = position
+            normalized = {
+                name: self.doc["accessors"][index].get("normalized", False)
+                for name, index in primitive["attributes"].items()
+            }
+            indices = self._read_accessor(primitive["indices"])[:, 0] if "indices" in primitive else None
+            if self.geometry == "meshopt" and indices is not None and primitive.get("mode", _TRIANGLES) == _TRIANGLES:
+                indices, attributes = self._optimize_order(indices, attributes)
+
+            primitive["attributes"] = {
+                name: self._write_attribute(name, array, normalized[name], center, scale)
+                for name, array in attributes.items()
+            }
+            if indices is not None:
+                primitive["indices"] = self._write_indices(indices, primitive.get("mode", _TRIANGLES))
+        self.extensions.add("KHR_mesh_quantization")
+        return center.tolist(), scale
+
+    def _optimize_order(self, indices: np.ndarray, attributes: dict) -> tuple[np.ndarray, dict]:
+        # Vertex-cache order for the triangles, then vertices in order of first use
+        optimized = np.zeros(len(indices), dtype=np.uint32)
+        _meshopt().optimize_vertex_cache(optimized, indices.astype(np.uint32), vertex_count=int(indices.max()) + 1)
+        used, first = np.unique(optimized, return_index=True)
+        order = used[np.argsort(first)]
+        remap = np.zeros(int(indices.max()) + 1, dtype=np.uint32)
+        remap[order] = np.arange(len(order), dtype=np.uint32)
+        return remap[optimized], {name: array[order] for name, array in attributes.items()}
+
+    def _write_attribute(
+        self, name: str, array: np.ndarray, normalized: bool, center: np.ndarray, scale: float
+    ) -> int:
+        accessor = {"count": len(array), "type": {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}[array.shape[1]]}
+        if name == "POSITION":
+            array = np.round((array - center) / scale).astype(np.int16)
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        elif name == "NORMAL":
+            array = np.round(np.clip(array, -1, 1) * 127).astype(np.int8)
+            accessor["normalized"] = True
+        elif name.startswith("TEXCOORD_") and array.size and array.min() >= 0 and array.max() <= 1:
+            array = np.round(array * 65535).astype(np.uint16)
+            accessor["normalized"] = True
+        elif array.dtype == np.float64:
+            array = array.astype(np.float32)
+        elif normalized:
+            accessor["normalized"] = True
+        accessor["componentType"] = _DTYPE_COMPONENTS[array.dtype]
+
+        array = _pad_columns(array)
+        if self.geometry == "meshopt":
+            accessor["bufferView"] = self._add_compressed_view(array, "ATTRIBUTES", _ARRAY_BUFFER)
+        else:
+            accessor["bufferView"] = self._add_view(array.tobytes(), stride=array.strides[0], target=_ARRAY_BUFFER)
+        return self._add_accessor(accessor)
+
+    def _write_indices(self, indices: np.ndarray, mode: int) -> int:
+        indices = indices.astype(np.uint16 if indices.max(initial=0) < 65535 else np.uint32)
+        accessor = {"count": len(indices), "type": "SCALAR", "componentType": _DTYPE_COMPONENTS[indices.dtype]}
+        if self.geometry == "meshopt" and mode == _TRIANGLES and len(indices):
+            accessor["bufferView"] = self._add_compressed_view(indices, "TRIANGLES", _ELEMENT_ARRAY_BUFFER)
+        else:
+            accessor["bufferView"] = self._add_view(indices.tobytes(), target=_ELEMENT_ARRAY_BUFFER)
+        return self._add_accessor(accessor)
+
+    def _attach_dequantization(self, dequantize: dict[int, tuple[list[float], float]]):
+        # The mesh moves to a new child node carrying the dequantization transform,
+        # so it composes with whatever transform the original node has
+        nodes = self.doc.get("nodes", [])
+        for node in list(nodes):
+            if node.get("mesh") not in dequantize:
+                continue
+            translation, scale = dequantize[node["mesh"]]
+            nodes.append({"mesh": node.pop("mesh"), "translation": translation, "scale": [scale] * 3})
+            node.setdefault("children", []).append(len(nodes) - 1)
+
+    # Textures
+
+    def _rewrite_images(self):
+        images = self.doc.get("images", [])
+        fallbacks = {}
+        for index, image in enumerate(list(images)):
+            if "bufferView" not in image:
+                continue
+            data = self._view_bytes(image["bufferView"])
+            encoded = self._encode_texture(data)
+            if encoded is None:
+                image["bufferView"] = self._keep_view(image["bufferView"])
+                continue
+            (data, image["mimeType"]), *fallback = encoded
+            image["bufferView"] = self._add_view(data)
+            if fallback:
+                data, mime_type = fallback[0]
+                images.append({"bufferView": self._add_view(data), "mimeType": mime_type})
+                fallbacks[index] = len(images) - 1
+
+        # The WebP image goes in the extension, the core source stays a JPEG or PNG
+        for texture in self.doc.get("textures", []):
+            if texture.get("source") in fallbacks:
+                texture.setdefault("extensions", {})["EXT_texture_webp"] = {"source": texture["source"]}
+                texture["source"] = fallbacks[texture["source"]]
+                self.optional_extensions.add("EXT_texture_webp")
+
+    def _encode_texture(self, data: bytes) -> Optional[list[tuple[bytes, str]]]:
+        # The re-encoded texture, followed by its fallback when it is WebP
+        from PIL import Image
+
+        if self.texture_format == "keep" and self.texture_size <= 0:
+            return None
+        image = Image.open(io.BytesIO(data))
+        source_format = (image.format or "").lower()
+        image_format = self.texture_format if self.texture_format != "keep" else source_format
+        if image_format not in ("png", "jpeg", "webp"):
+            return None
+
+        image.load()
+        if self.texture_size > 0 and max(image.size) > self.texture_size:
+            image.thumbnail((self.texture_size, self.texture_size), Image.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA") and image.getextrema()[-1][0] < 255
+        if image_format == "jpeg" and has_alpha:
+            image_format = "png"
+        if not has_alpha and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        encoded = self._save_texture(image, image_format)
+        if len(encoded) >= len(data) and image_format == source_format:
+            return None
+        textures = [(encoded, f"image/{image_format}")]
+        if image_format == "webp":
+            fallback_format = "png" if has_alpha else "jpeg"
+            textures.append((self._save_texture(image, fallback_format), f"image/{fallback_format}"))
+        return textures
+
+    def _save_texture(self, image, image_format: str) -> bytes:
+        out = io.BytesIO()
+        if image_format == "png":
+            image.save(out, format="PNG", optimize=True)
+        else:
+            image.save(out, format=image_format.upper(), quality=self.texture_quality)
+        return out.getvalue()
@@ -0,0 +1,53 @@
+"""Decoding of uploaded images at the resolution a model works at.
+
+Phone photos are 12-48 MP while the image-to-3D models work at about 1 MP and
+downsample whatever they get. JPEGs are decoded straight at 1/2, 1/4 or 1/8
+scale from the DCT coefficients (PIL draft mode); other formats are decoded in
+full, box-reduced by an integer factor and then resampled. Uploads over the
+byte or pixel limit are rejected from their header, before any pixel is
+decoded. Every input that cannot be used, over a limit, not an image, or
+truncated or corrupt, raises ValueError.
+"""
+
+import io
+
+from PIL import Image, UnidentifiedImageError
+
+
+def decode_image(
+    data: bytes, max_side: int, max_bytes: int = 0, max_pixels: int = 0, mode: str = "RGBA", metrics=None
+) -> Image.Image:
+    # The image in `mode`, with its longer side at most max_side (0 keeps the full size).
+    # Limits of 0 mean no limit; inputs over a limit raise ValueError
+    if metrics is not None:
+        metrics.observe_input("bytes", len(data))
+    if max_bytes and len(data) > max_bytes:
+        raise ValueError(f"Input image is {len(data) / 2**20:.1f} MB, the limit is {max_bytes / 2**20:.0f} MB")
+    try:
+        image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise ValueError("Input is not an image in a format PIL can decode") from None
+    except Image.DecompressionBombError:
+        # PIL's own guard, at twice Image.MAX_IMAGE_PIXELS, checks the header as well
+        limit = f"the limit is {max_pixels / 1e6:.0f} MP" if max_pixels else "PIL refuses to decode it"
+        raise ValueError(f"Input image is over {2 * Image.MAX_IMAGE_PIXELS / 1e6:.0f} MP, {limit}") from None
+
+    width, height = image.size
+    if metrics is not None:
+        metrics.observe_input("pixels", width * height)
+    if max_pixels and width * height > max_pixels:
+        raise ValueError(
+            f"Input image is {width}x{height} ({width * height / 1e6:.1f} MP), the limit is {max_pixels / 1e6:.0f} MP"
+        )
+
+    try:
+        if max_side and max(width, height) > max_side:
+            # A JPEG decodes at the smallest 1/2**k scale that still covers the target size;
+            # thumbnail() then box-reduces by an integer factor before it resamples
+            scale = max_side / max(width, height)
+            image.draft(None, (round(width * scale), round(height * scale)))
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        return image.convert(mode)
+    except OSError as e:
+        # Pixel data is only read here, truncated and corrupt files fail now
+        raise ValueError(f"Input image could not be decoded, it is truncated or corrupt ({e})") from None
@@ -0,0 +1,177 @@
+"""Per-stage latency histograms, event counters and state gauges for the Python backends.
+
+Exported through Triton's custom metrics API, so they show up next to the
+built-in metrics on the metrics port. Outside Triton the offline pb_utils
+(triton_common.offline) uses the MetricFamily stand-in below, which keeps the
+same values in process and serves them on the harness' /metrics page.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+# Input sizes, bytes or pixels alike: 16 Ki to 256 Mi in steps of 4
+INPUT_SIZE_BUCKETS = [4**k for k in range(7, 15)]
+
+
+class MetricFamily:
+    # Mirrors triton_python_backend_utils.MetricFamily
+    COUNTER = 0
+    GAUGE = 1
+    HISTOGRAM = 2
+
+    # Every family created in this process, for offline inspection
+    families: list["MetricFamily"] = []
+
+    def __init__(self, name: str, description: str, kind: int):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.metrics: list[_LocalMetric] = []
+        MetricFamily.families.append(self)
+
+    def Metric(self, labels: Optional[dict] = None, buckets: Optional[list[float]] = None) -> "_LocalMetric":
+        metric = _LocalMetric(labels or {}, buckets if self.kind == self.HISTOGRAM else None)
+        self.metrics.append(metric)
+        return metric
+
+
+class _LocalMetric:
+    def __init__(self, labels: dict, buckets: Optional[list[float]]):
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self.count = 0
+        self.bucket_counts = [0] * (len(buckets) + 1) if buckets is not None else None
+
+    def increment(self, value: float):
+        with self._lock:
+            self._value += value
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def observe(self, value: float):
+        with self._lock:
+            self._value += value
+            self.count += 1
+            self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+
+    def value(self) -> float:
+        # Histograms report their sum, like the Triton metric
+        return self._value
+
+
+class _CounterHistogram:
+    # Sum and count counters for Triton releases without histogram metrics
+    def __init__(self, total, calls):
+        self._total = total
+        self._calls = calls
+
+    def observe(self, value: float):
+        self._total.increment(value)
+        self._calls.increment(1)
+
+
+class _CounterHistogramFamily:
+    def __init__(self, family, name: str, description: str):
+        self._total = family(name=f"{name}_sum", description=description, kind=family.COUNTER)
+        self._calls = family(name=f"{name}_count", description=f"{description} (calls)", kind=family.COUNTER)
+
+    def Metric(self, labels: dict, buckets: Optional[list[float]] = None) -> _CounterHistogram:
+        return _CounterHistogram(self._total.Metric(labels=labels), self._calls.Metric(labels=labels))
+
+
+def _histogram_family(family, name: str, description: str):
+    if hasattr(family, "HISTOGRAM"):
+        return family(name=name, description=description, kind=family.HISTOGRAM)
+    return _CounterHistogramFamily(family, name, description)
+
+
+class ModelMetrics:
+    def __init__(self, pb_utils, model_name: str):
+        self.model_name = model_name
+        self._latency_family = _histogram_family(
+            pb_utils.MetricFamily,
+            "model_stage_latency_seconds",
+            "Latency of one stage of a Python backend model, per call",
+        )
+        self._batch_family = _histogram_family(
+            pb_utils.MetricFamily,
+            "model_stage_batch_size",
+            "Items handled per call of one stage of a Python backend model",
+        )
+        self._input_family = _histogram_family(
+            pb_utils.MetricFamily,
+            "model_input_size",
+            "Size of one input of a Python backend model, per unit (bytes, pixels)",
+        )
+        self._events_family = pb_utils.MetricFamily(
+            name="model_events_total",
+            description="Events of a Python backend model (cache hits, cancellations, ...)",
+            kind=pb_utils.MetricFamily.COUNTER,
+        )
+        self._state_family = pb_utils.MetricFamily(
+            name="model_state",
+            description="Current state of a Python backend model (cache size, hit ratio, ...)",
+            kind=pb_utils.MetricFamily.GAUGE,
+        )
+        self._lock = threading.Lock()
+        self._latency: dict[str, object] = {}
+        self._batch: dict[str, object] = {}
+        self._input: dict[str, object] = {}
+        self._events: dict[str, object] = {}
+        self._state: dict[str, object] = {}
+
+    def observe(self, stage: str, seconds: float, batch_size: Optional[int] = None):
+        self._metric(self._latency, self._latency_family, "stage", stage, LATENCY_BUCKETS).observe(seconds)
+        if batch_size is not None:
+            self.observe_batch(stage, batch_size)
+
+    def observe_batch(self, stage: str, batch_size: int):
+        self._metric(self._batch, self._batch_family, "stage", stage, BATCH_SIZE_BUCKETS).observe(batch_size)
+
+    def observe_input(self, unit: str, size: float):
+        self._metric(self._input, self._input_family, "unit", unit, INPUT_SIZE_BUCKETS).observe(size)
+
+    def increment(self, event: str, value: float = 1):
+        self._metric(self._events, self._events_family, "event", event).increment(value)
+
+    def set(self, name: str, value: float):
+        self._metric(self._state, self._state_family, "name", name).set(value)
+
+    @contextmanager
+    def time(self, stage: str, batch_size: Optional[int] = None):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - start, batch_size)
+
+    def summary(self) -> dict[str, dict]:
+        with self._lock:
+            latency = dict(self._latency)
+        summary = {}
+        for stage, metric in latency.items():
+            # Only the local stand-in can be read back; Triton's histograms live in the server
+            count = getattr(metric, "count", None)
+            if count:
+                summary[stage] = {"count": count, "mean_s": metric.value() / count}
+        return summary
+
+    def _metric(self, metrics: dict, family, label: str, value: str, buckets: Optional[list[float]] = None):
+        metric = metrics.get(value)
+        if metric is None:
+            with self._lock:
+                metric = metrics.get(value)
+                if metric is None:
+                    labels = {"model": self.model_name, label: value}
+                    metric = family.Metric(labels=labels, buckets=buckets) if buckets else family.Metric(labels=labels)
+                    metrics[value] = metric
+        return metric
@@ -0,0 +1,27 @@
+"""Offline harness for the Python backend models: no Triton, no GPU.
+
+    repository = ModelRepository("model_repository", stubs=STUB_MODULES)
+    repository.load("stable_diffusion", max_batch_size=8)
+    responses = repository.infer("stable_diffusion", {"prompt": np.array([[b"a cat"]], dtype=object)})
+
+The stubs replace the heavy imports of the models (torch, diffusers, hy3dgen,
+...) with CPU stand-ins, see benchmarks/. make_server() serves the repository
+over KServe v2 HTTP for the clients, python -m triton_common.offline does both
+from the command line. Models of other platforms load with a model.py stand-in,
+repository.load("unet", model_file="benchmarks/unet_plan_standin.py"), and
+ensembles run on the models loaded next to them.
+"""
+
+from triton_common.offline.config import load_config, parse_config
+from triton_common.offline.http import make_server
+from triton_common.offline.repository import EnsembleModel, HostedModel, ModelRepository, install_modules
+
+__all__ = [
+    "EnsembleModel",
+    "HostedModel",
+    "ModelRepository",
+    "install_modules",
+    "load_config",
+    "make_server",
+    "parse_config",
+]
@@ -0,0 +1,59 @@
+"""Serve model_repository models over KServe v2 HTTP with stub pipelines.
+
+    python -m triton_common.offline --model stable_diffusion --stubs benchmarks/stable_diffusion_batching.py
+
+Every --stubs file defines STUB_MODULES, {module name: {attribute: value}}. Models
+that are not Python backend models need a model.py stand-in:
+
+    python -m triton_common.offline --model unet --model unet_postprocess --model unet_segmentation \
+        --model-file unet=benchmarks/unet_plan_standin.py
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+
+from triton_common.offline import ModelRepository, make_server
+
+
+def load_stub_modules(paths: list[str]) -> dict[str, dict]:
+    modules: dict[str, dict] = {}
+    for path in paths:
+        spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules.update(module.STUB_MODULES)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-repository", default="model_repository")
+    parser.add_argument("--model", action="append", required=True, help="model to load, repeatable")
+    parser.add_argument("--model-config-name", default=None, help="load configs/<name>.pbtxt where it exists")
+    parser.add_argument("--stubs", action="append", default=[], help="file defining STUB_MODULES, repeatable")
+    parser.add_argument(
+        "--model-file", action="append", default=[], help="<model>=<model.py> stand-in for a model, repeatable"
+    )
+    parser.add_argument("--http-port", type=int, default=8000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    repository = ModelRepository(args.model_repository, stubs=load_stub_modules(args.stubs))
+    model_files = dict(entry.split("=", 1) for entry in args.model_file)
+    for name in args.model:
+        repository.load(name, args.model_config_name, model_files.get(name))
+    server = make_server(repository, port=args.http_port)
+    logging.info(f"Serving {args.model} on :{args.http_port} (KServe v2 HTTP, /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        repository.shutdown()
+
+
+if __name__ == "__main__":
+    main()
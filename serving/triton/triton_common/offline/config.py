@@ -0,0 +1,132 @@
+"""Reads config.pbtxt into the JSON model config Triton hands to initialize().
+
+Protobuf text format is parsed without protobuf: messages become dicts,
+repeated fields lists and the map fields ("parameters" and the input_map /
+output_map of ensemble steps) {key: value} dicts, the way Triton's JSON config
+has them. Enum and bool values stay strings and bools.
+"""
+
+import os
+import re
+from typing import Any, Optional
+
+# Fields that are repeated in ModelConfig and therefore always lists in the JSON config
+REPEATED_FIELDS = {
+    "input",
+    "output",
+    "instance_group",
+    "dims",
+    "preferred_batch_size",
+    "gpus",
+    "parameters",
+    "step",
+    "input_map",
+    "output_map",
+}
+
+_TOKEN = re.compile(
+    r"""
+    \s+ | \#[^\n]* |                             # whitespace and comments
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*') |
+    (?P<number>-?\d+\.?\d*(?:[eE][-+]?\d+)?) |
+    (?P<word>[A-Za-z_][\w.]*) |
+    (?P<punct>[{}\[\]:,<>])
+    """,
+    re.VERBOSE,
+)
+
+
+def _tokens(text: str) -> list[tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Unexpected character {text[position]!r} at offset {position}")
+        position = match.end()
+        if match.lastgroup:
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokens(text)
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][1] if self.position < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> tuple[str, str]:
+        if self.position >= len(self.tokens):
+            raise ValueError("Unexpected end of config")
+        token = self.tokens[self.position]
+        if expected is not None and token[1] != expected:
+            raise ValueError(f"Expected {expected!r}, got {token[1]!r}")
+        self.position += 1
+        return token
+
+    def message(self, end: Optional[str] = None) -> dict:
+        fields: dict[str, Any] = {}
+        while self.peek() != end:
+            _, name = self.take()
+            if self.peek() == ":":
+                self.take(":")
+            value = self.value()
+            if name in REPEATED_FIELDS:
+                fields.setdefault(name, []).extend(value if isinstance(value, list) else [value])
+            else:
+                fields[name] = value
+            if self.peek() in (",", ";"):
+                self.take()
+        if end is not None:
+            self.take(end)
+        return fields
+
+    def value(self) -> Any:
+        token = self.peek()
+        if token in ("{", "<"):
+            self.take()
+            return self.message("}" if token == "{" else ">")
+        if token == "[":
+            self.take("[")
+            values = []
+            while self.peek() != "]":
+                values.append(self.value())
+                if self.peek() == ",":
+                    self.take(",")
+            self.take("]")
+            return values
+        kind, text = self.take()
+        if kind == "string":
+            return text[1:-1].encode("latin-1", "backslashreplace").decode("unicode_escape")
+        if kind == "number":
+            return float(text) if any(c in text for c in ".eE") else int(text)
+        if text in ("true", "false"):
+            return text == "true"
+        return text
+
+
+def _map(entries: list[dict]) -> dict:
+    return {entry["key"]: entry["value"] for entry in entries}
+
+
+def parse_config(text: str) -> dict:
+    config = _Parser(text).message()
+    config["parameters"] = _map(config.get("parameters", []))
+    for step in config.get("ensemble_scheduling", {}).get("step", []):
+        step["input_map"] = _map(step.get("input_map", []))
+        step["output_map"] = _map(step.get("output_map", []))
+    return config
+
+
+def load_config(model_dir: str, config_name: Optional[str] = None) -> dict:
+    # --model-config-name=<name> loads configs/<name>.pbtxt instead of config.pbtxt
+    path = os.path.join(model_dir, "configs", f"{config_name}.pbtxt") if config_name else None
+    if path is None or not os.path.exists(path):
+        path = os.path.join(model_dir, "config.pbtxt")
+    with open(path) as f:
+        config = parse_config(f.read())
+    config.setdefault("name", os.path.basename(os.path.normpath(model_dir)))
+    config.setdefault("max_batch_size", 0)
+    return config
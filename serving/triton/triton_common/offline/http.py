@@ -0,0 +1,267 @@
+"""KServe v2 HTTP/REST frontend for a ModelRepository.
+
+Implements the endpoints the clients use: health, server and model metadata,
+model config, infer (JSON tensors, the binary tensor data extension that
+tritonclient sends by default and system shared memory regions) and a
+Prometheus /metrics page with the custom metrics of the hosted models. Decoupled models answer on the Python
+API (ModelRepository.stream) only, as /infer expects exactly one response.
+"""
+
+import json
+import logging
+import re
+import struct
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Union
+
+import numpy as np
+
+from triton_common.metrics import MetricFamily
+from triton_common.offline import pb_utils
+from triton_common.offline.repository import ModelRepository
+from triton_common.offline.shared_memory import SharedMemoryError, SystemSharedMemory
+
+DATATYPES = {
+    "BOOL": np.bool_,
+    "UINT8": np.uint8,
+    "UINT16": np.uint16,
+    "UINT32": np.uint32,
+    "UINT64": np.uint64,
+    "INT8": np.int8,
+    "INT16": np.int16,
+    "INT32": np.int32,
+    "INT64": np.int64,
+    "FP16": np.float16,
+    "FP32": np.float32,
+    "FP64": np.float64,
+    "BYTES": np.object_,
+}
+
+_MODEL_PATH = re.compile(r"^/v2/models/(?P<name>[^/]+)(?:/versions/[^/]+)?(?P<action>/ready|/config|/infer)?$")
+_SHM_PATH = re.compile(r"^/v2/systemsharedmemory(?:/region/(?P<name>[^/]+))?/(?P<action>status|register|unregister)$")
+
+
+def datatype_of(array: np.ndarray) -> str:
+    if array.dtype == np.object_ or array.dtype.kind in "SU":
+        return "BYTES"
+    return next(name for name, dtype in DATATYPES.items() if dtype != np.object_ and array.dtype == dtype)
+
+
+def deserialize_bytes(data: bytes) -> list[bytes]:
+    # Every element is a 4-byte little-endian length followed by the bytes
+    elements, offset = [], 0
+    while offset < len(data):
+        (length,) = struct.unpack_from("<I", data, offset)
+        elements.append(data[offset + 4 : offset + 4 + length])
+        offset += 4 + length
+    return elements
+
+
+def serialize_bytes(array: np.ndarray) -> bytes:
+    chunks = []
+    for element in array.reshape(-1):
+        element = element if isinstance(element, bytes) else str(element).encode("utf-8")
+        chunks.append(struct.pack("<I", len(element)) + element)
+    return b"".join(chunks)
+
+
+def decode_inputs(header: dict, binary: bytes, shared_memory: SystemSharedMemory) -> list[pb_utils.Tensor]:
+    tensors, offset = [], 0
+    for entry in header.get("inputs", []):
+        shape, datatype = entry["shape"], entry["datatype"]
+        parameters = entry.get("parameters", {})
+        size = parameters.get("binary_data_size")
+        region = parameters.get("shared_memory_region")
+        if region is not None or size is not None:
+            if region is not None:
+                data = shared_memory.read(
+                    region, parameters.get("shared_memory_offset", 0), parameters["shared_memory_byte_size"]
+                )
+            else:
+                data = binary[offset : offset + size]
+                offset += size
+            if datatype == "BYTES":
+                array = np.array(deserialize_bytes(data), dtype=object)
+            else:
+                array = np.frombuffer(data, dtype=DATATYPES[datatype]).copy()
+        else:
+            values = np.array(entry["data"]).reshape(-1)
+            if datatype == "BYTES":
+                array = np.array([v.encode("utf-8") if isinstance(v, str) else v for v in values], dtype=object)
+            else:
+                array = values.astype(DATATYPES[datatype])
+        tensors.append(pb_utils.Tensor(entry["name"], array.reshape(shape)))
+    return tensors
+
+
+def encode_outputs(
+    header: dict, response: pb_utils.InferenceResponse, shared_memory: SystemSharedMemory
+) -> tuple[dict, bytes]:
+    binary_default = header.get("parameters", {}).get("binary_data_output", False)
+    requested = {entry["name"]: entry.get("parameters", {}) for entry in header.get("outputs", [])}
+    outputs, chunks = [], []
+    for tensor in response.output_tensors():
+        if requested and tensor.name() not in requested:
+            continue
+        array = tensor.as_numpy()
+        datatype = datatype_of(array)
+        entry = {"name": tensor.name(), "datatype": datatype, "shape": list(array.shape)}
+        parameters = requested.get(tensor.name(), {})
+        if "shared_memory_region" in parameters or parameters.get("binary_data", binary_default):
+            data = serialize_bytes(array) if datatype == "BYTES" else np.ascontiguousarray(array).tobytes()
+            if "shared_memory_region" in parameters:
+                # The client reads the region with the datatype and shape of this entry
+                shared_memory.write(
+                    parameters["shared_memory_region"],
+                    parameters.get("shared_memory_offset", 0),
+                    parameters["shared_memory_byte_size"],
+                    data,
+                    tensor.name(),
+                )
+            else:
+                entry["parameters"] = {"binary_data_size": len(data)}
+                chunks.append(data)
+        elif datatype == "BYTES":
+            entry["data"] = [v.decode("utf-8") if isinstance(v, bytes) else v for v in array.reshape(-1)]
+        else:
+            entry["data"] = array.reshape(-1).tolist()
+        outputs.append(entry)
+    return {"outputs": outputs}, b"".join(chunks)
+
+
+def format_metrics() -> str:
+    # Prometheus text format of every metric family created in this process
+    lines = []
+    for family in MetricFamily.families:
+        kind = {MetricFamily.COUNTER: "counter", MetricFamily.GAUGE: "gauge"}.get(family.kind, "histogram")
+        lines += [f"# HELP {family.name} {family.description}", f"# TYPE {family.name} {kind}"]
+        for metric in family.metrics:
+            labels = ",".join(f'{k}="{v}"' for k, v in metric.labels.items())
+            if metric.buckets is None:
+                lines.append(f"{family.name}{{{labels}}} {metric.value()}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ["+Inf"], metric.bucket_counts):
+                cumulative += count
+                lines.append(f'{family.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{family.name}_sum{{{labels}}} {metric.value()}")
+            lines.append(f"{family.name}_count{{{labels}}} {metric.count}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle a small response waits for the delayed ACK
+    disable_nagle_algorithm = True
+    repository: ModelRepository
+    shared_memory: SystemSharedMemory
+
+    def log_message(self, format, *args):
+        logging.debug(format, *args)
+
+    def do_GET(self):
+        if self.path in ("/v2/health/live", "/v2/health/ready"):
+            return self._reply(200)
+        if self.path == "/v2":
+            return self._json(200, {"name": "triton-offline", "version": "0", "extensions": ["binary_tensor_data"]})
+        if self.path == "/metrics":
+            return self._reply(200, format_metrics().encode(), "text/plain; version=0.0.4")
+        shm = _SHM_PATH.match(self.path)
+        if shm is not None and shm["action"] == "status":
+            try:
+                return self._json(200, self.shared_memory.status(shm["name"]))
+            except SharedMemoryError as e:
+                return self._json(400, {"error": str(e)})
+        match = _MODEL_PATH.match(self.path)
+        model = self.repository.models.get(match["name"]) if match else None
+        if model is None:
+            return self._json(400, {"error": f"Request for unknown model: '{self.path}' is not found"})
+        if match["action"] == "/ready":
+            return self._reply(200)
+        if match["action"] == "/config":
+            return self._json(200, model.config)
+        if match["action"] is None:
+            return self._json(200, model.metadata())
+        return self._json(400, {"error": f"Unsupported GET {self.path}"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        shm = _SHM_PATH.match(self.path)
+        if shm is not None and shm["action"] != "status":
+            return self._shared_memory(shm["action"], shm["name"], body)
+        match = _MODEL_PATH.match(self.path)
+        if match is None or match["action"] != "/infer":
+            return self._json(404, {"error": f"Not found: {self.path}"})
+        model = self.repository.models.get(match["name"])
+        if model is None:
+            return self._json(400, {"error": f"Request for unknown model: '{match['name']}' is not found"})
+        if model.decoupled:
+            return self._json(400, {"error": f"Model '{match['name']}' is decoupled, /infer needs one response"})
+
+        header_length = int(self.headers.get("Inference-Header-Content-Length", len(body)))
+        header = json.loads(body[:header_length])
+        try:
+            inputs = decode_inputs(header, body[header_length:], self.shared_memory)
+        except SharedMemoryError as e:
+            return self._json(400, {"error": str(e)})
+        except (KeyError, ValueError) as e:
+            return self._json(400, {"error": f"Malformed inference request: {e}"})
+        names = [entry["name"] for entry in header.get("outputs", [])]
+        request = pb_utils.InferenceRequest(
+            model_name=match["name"],
+            inputs=inputs,
+            requested_output_names=names,
+            request_id=header.get("id", ""),
+            timeout=int(header.get("parameters", {}).get("timeout", 0)),
+        )
+        response = next(iter(self.repository.stream(request)))
+        if response.has_error():
+            return self._json(400, {"error": response.error().message()})
+
+        try:
+            result, binary = encode_outputs(header, response, self.shared_memory)
+        except SharedMemoryError as e:
+            return self._json(400, {"error": str(e)})
+        result.update({"model_name": match["name"], "model_version": "1"})
+        if "id" in header:
+            result["id"] = header["id"]
+        result_json = json.dumps(result).encode()
+        if not binary:
+            return self._reply(200, result_json, "application/json")
+        self._reply(
+            200,
+            result_json + binary,
+            "application/octet-stream",
+            {"Inference-Header-Content-Length": str(len(result_json))},
+        )
+
+    def _shared_memory(self, action: str, name: Optional[str], body: bytes):
+        try:
+            if action == "register":
+                request = json.loads(body)
+                self.shared_memory.register(name, request["key"], request.get("offset", 0), request["byte_size"])
+            else:
+                self.shared_memory.unregister(name)
+        except (KeyError, ValueError, SharedMemoryError) as e:
+            return self._json(400, {"error": str(e)})
+        self._reply(200)
+
+    def _json(self, status: int, payload: Union[dict, list]):
+        self._reply(status, json.dumps(payload).encode(), "application/json")
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "", headers: Optional[dict] = None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(repository: ModelRepository, host: str = "0.0.0.0", port: int = 8000) -> ThreadingHTTPServer:
+    handler = type("Handler", (_Handler,), {"repository": repository, "shared_memory": SystemSharedMemory()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
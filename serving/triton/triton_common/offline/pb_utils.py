@@ -0,0 +1,174 @@
+"""Stand-in for triton_python_backend_utils outside a Triton container.
+
+Covers the part of the Python backend API the models use: tensors, requests
+with BLS exec and decoupled response senders, responses, errors and custom
+metrics. BLS requests are routed to the models of the ModelRepository that
+installed this module; without one, exec raises.
+"""
+
+import json
+import queue
+import threading
+from typing import Iterator, Optional
+
+import numpy as np
+
+from triton_common.metrics import MetricFamily  # noqa: F401 (re-exported)
+
+TRITONSERVER_RESPONSE_COMPLETE_FINAL = 1
+
+# Set by ModelRepository, routes BLS requests to the models it hosts
+_repository = None
+
+
+class TritonError(Exception):
+    UNKNOWN = 0
+    INTERNAL = 1
+    NOT_FOUND = 2
+    INVALID_ARG = 3
+    UNAVAILABLE = 4
+    UNSUPPORTED = 5
+    ALREADY_EXISTS = 6
+    CANCELLED = 7
+
+    def __init__(self, message: str, code: int = UNKNOWN):
+        super().__init__(message)
+        self._message = message
+        self._code = code
+
+    def message(self) -> str:
+        return self._message
+
+    def code(self) -> int:
+        return self._code
+
+
+class Tensor:
+    def __init__(self, name: str, data: np.ndarray):
+        self._name = name
+        self._data = np.asarray(data)
+
+    def name(self) -> str:
+        return self._name
+
+    def as_numpy(self) -> np.ndarray:
+        return self._data
+
+    def shape(self) -> tuple:
+        return self._data.shape
+
+    def is_cpu(self) -> bool:
+        return True
+
+
+class InferenceResponse:
+    def __init__(self, output_tensors: Optional[list[Tensor]] = None, error: Optional[TritonError] = None):
+        self._output_tensors = list(output_tensors or [])
+        self._error = error
+
+    def output_tensors(self) -> list[Tensor]:
+        return self._output_tensors
+
+    def has_error(self) -> bool:
+        return self._error is not None
+
+    def error(self) -> Optional[TritonError]:
+        return self._error
+
+
+class InferenceResponseSender:
+    # Responses of a decoupled model, in the order they are sent
+    def __init__(self, cancelled: Optional[threading.Event] = None):
+        self._responses: queue.Queue = queue.Queue()
+        self._cancelled = cancelled or threading.Event()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def send(self, response: Optional[InferenceResponse] = None, flags: int = 0):
+        with self._lock:
+            if self._closed:
+                raise TritonError("Unable to send response: the final response has already been sent")
+            if flags & TRITONSERVER_RESPONSE_COMPLETE_FINAL:
+                self._closed = True
+        self._responses.put((response, flags))
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def responses(self, timeout: Optional[float] = None) -> Iterator[InferenceResponse]:
+        # Yields every response until the one flagged final
+        while True:
+            response, flags = self._responses.get(timeout=timeout)
+            if response is not None:
+                yield response
+            if flags & TRITONSERVER_RESPONSE_COMPLETE_FINAL:
+                return
+
+
+class InferenceRequest:
+    # Client requests handed to execute() and BLS requests built by a model alike
+    def __init__(
+        self,
+        model_name: str = "",
+        inputs: Optional[list[Tensor]] = None,
+        requested_output_names: Optional[list[str]] = None,
+        request_id: str = "",
+        model_version: int = -1,
+        timeout: int = 0,
+        parameters: Optional[dict] = None,
+    ):
+        self.model_name = model_name
+        self.model_version = model_version
+        self.timeout = timeout
+        self._inputs = list(inputs or [])
+        self._requested_output_names = list(requested_output_names or [])
+        self._request_id = request_id
+        self._parameters = dict(parameters or {})
+        self._cancelled = threading.Event()
+        self._sender = InferenceResponseSender(self._cancelled)
+
+    def inputs(self) -> list[Tensor]:
+        return self._inputs
+
+    def request_id(self) -> str:
+        return self._request_id
+
+    def requested_output_names(self) -> list[str]:
+        return self._requested_output_names
+
+    def parameters(self) -> str:
+        return json.dumps(self._parameters)
+
+    def get_response_sender(self) -> InferenceResponseSender:
+        return self._sender
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        # What Triton does when the client cancels or goes away
+        self._cancelled.set()
+
+    def exec(self, decoupled: bool = False):
+        if _repository is None:
+            raise TritonError("BLS needs a ModelRepository to route requests to", TritonError.UNAVAILABLE)
+        responses = _repository.stream(self)
+        if decoupled:
+            return responses
+        collected = list(responses)
+        if len(collected) != 1:
+            error = TritonError(f"'{self.model_name}' sent {len(collected)} responses, exec expects exactly one")
+            return InferenceResponse(error=error)
+        return collected[0]
+
+
+def get_input_tensor_by_name(request: InferenceRequest, name: str) -> Optional[Tensor]:
+    return next((tensor for tensor in request.inputs() if tensor.name() == name), None)
+
+
+def get_output_tensor_by_name(response: InferenceResponse, name: str) -> Optional[Tensor]:
+    return next((tensor for tensor in response.output_tensors() if tensor.name() == name), None)
+
+
+def using_decoupled_model_transaction_policy(model_config: dict) -> bool:
+    return bool(model_config.get("model_transaction_policy", {}).get("decoupled", False))
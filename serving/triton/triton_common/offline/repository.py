@@ -0,0 +1,350 @@
+"""Loads model_repository/<model>/1/model.py files and schedules requests like Triton.
+
+Every instance of a model is its own TritonPythonModel, loaded from a fresh
+copy of the module, with a thread that takes requests off the model's queue.
+With dynamic batching an instance lets later requests join the first until
+max_batch_size or max_queue_delay is reached; without, it runs one request
+per execute(). Requests cancelled or timed out (default_queue_policy, or a
+request's own timeout where the policy allows it) while queued are answered
+with an error and never reach the model, as in Triton. Stub modules (torch, diffusers, hy3dgen, ...) are installed
+into sys.modules before any model is loaded, together with the pb_utils
+stand-in, so the models run unchanged on a CPU box.
+
+Models of other platforms, such as a TensorRT plan, run as a model.py
+stand-in passed as model_file. Ensembles run their steps through the
+repository, so the composing models batch across ensemble requests the way
+they do in Triton.
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import numpy as np
+
+from triton_common.offline import pb_utils
+from triton_common.offline.config import load_config
+
+_STOP = object()
+
+
+def install_modules(modules: dict[str, dict]):
+    # {"hy3dgen.shapegen": {"Hunyuan3DDiTFlowMatchingPipeline": Stub}, ...}
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+
+
+class _ServedModel:
+    # Metadata and input checks, which Triton derives from the config alone
+    name: str
+    config: dict
+    max_batch_size: int
+
+    def metadata(self) -> dict:
+        def tensors(entries: list[dict]) -> list[dict]:
+            batch = [-1] if self.max_batch_size > 0 else []
+            return [
+                {
+                    "name": entry["name"],
+                    "datatype": entry["data_type"].replace("TYPE_", "").replace("STRING", "BYTES"),
+                    "shape": batch + list(entry["dims"]),
+                }
+                for entry in entries
+            ]
+
+        return {
+            "name": self.name,
+            "versions": ["1"],
+            "platform": self.config.get("platform") or self.config.get("backend", "python"),
+            "inputs": tensors(self.config.get("input", [])),
+            "outputs": tensors(self.config.get("output", [])),
+        }
+
+    def validate(self, request: pb_utils.InferenceRequest):
+        # Triton rejects these before the model sees them
+        expected = {entry["name"]: entry for entry in self.config.get("input", [])}
+        names = [tensor.name() for tensor in request.inputs()]
+        unknown = [name for name in names if name not in expected]
+        if unknown:
+            message = f"unexpected inference input {unknown} for model '{self.name}'"
+            raise pb_utils.TritonError(message, pb_utils.TritonError.INVALID_ARG)
+        missing = [name for name, entry in expected.items() if not entry.get("optional") and name not in names]
+        if missing:
+            message = f"expected inputs {missing} for model '{self.name}'"
+            raise pb_utils.TritonError(message, pb_utils.TritonError.INVALID_ARG)
+        if self.max_batch_size > 0:
+            for tensor in request.inputs():
+                if tensor.shape()[0] > self.max_batch_size:
+                    message = f"inference request batch-size must be <= {self.max_batch_size} for '{self.name}'"
+                    raise pb_utils.TritonError(message, pb_utils.TritonError.INVALID_ARG)
+
+
+class HostedModel(_ServedModel):
+    def __init__(
+        self,
+        repository_dir: str,
+        name: str,
+        config_name: Optional[str] = None,
+        model_file: Optional[str] = None,
+        **overrides,
+    ):
+        # model_file is a model.py that stands in for a model of another platform
+        self.name = name
+        self.model_dir = os.path.join(repository_dir, name)
+        self.model_file = model_file or os.path.join(self.model_dir, "1", "model.py")
+        self.config = load_config(self.model_dir, config_name)
+        if self.config.get("backend") != "python" and model_file is None:
+            message = f"'{name}' is not a Python backend model, it runs offline only with a model.py stand-in"
+            raise ValueError(message)
+        for key, value in overrides.items():
+            if key == "parameters":
+                self.config["parameters"].update({k: {"string_value": str(v)} for k, v in value.items()})
+            else:
+                self.config[key] = value
+        self.decoupled = pb_utils.using_decoupled_model_transaction_policy(self.config)
+        self.max_batch_size = self.config["max_batch_size"]
+
+        batching = self.config.get("dynamic_batching")
+        self.max_queue_delay = None
+        if batching is not None and self.max_batch_size > 0:
+            self.max_queue_delay = int(batching.get("max_queue_delay_microseconds", 0)) / 1e6
+        self.queue_policy = (batching or {}).get("default_queue_policy", {})
+
+        self._queue: queue.Queue = queue.Queue()
+        self.instances = []
+        self._threads = []
+        for group in self.config.get("instance_group", [{}]):
+            kind = group.get("kind", "KIND_CPU")
+            for _ in range(int(group.get("count", 1))):
+                index = len(self.instances)
+                self.instances.append(self._load_instance(f"{name}_{index}", kind))
+                thread = threading.Thread(
+                    target=self._run, args=(self.instances[-1],), name=f"{name}_{index}", daemon=True
+                )
+                self._threads.append(thread)
+        for thread in self._threads:
+            thread.start()
+
+    def _load_instance(self, instance_name: str, kind: str):
+        spec = importlib.util.spec_from_file_location(instance_name, self.model_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        model = module.TritonPythonModel()
+        model.initialize(
+            {
+                "model_config": json.dumps(self.config),
+                "model_instance_kind": kind.replace("KIND_", ""),
+                "model_instance_name": instance_name,
+                "model_instance_device_id": "0",
+                "model_repository": self.model_dir,
+                "model_version": "1",
+                "model_name": self.name,
+            }
+        )
+        return model
+
+    def submit(self, request: pb_utils.InferenceRequest) -> Iterator[pb_utils.InferenceResponse]:
+        self.validate(request)
+        self._queue.put((time.monotonic(), request))
+        return request.get_response_sender().responses()
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        for instance in self.instances:
+            if hasattr(instance, "finalize"):
+                instance.finalize()
+
+    def _batch_size(self, request: pb_utils.InferenceRequest) -> int:
+        return request.inputs()[0].shape()[0] if self.max_batch_size > 0 and request.inputs() else 1
+
+    def _timeout(self, request: pb_utils.InferenceRequest) -> float:
+        # Seconds the request may wait in the queue, 0 for no limit
+        timeout = int(self.queue_policy.get("default_timeout_microseconds", 0))
+        if request.timeout and self.queue_policy.get("allow_timeout_override"):
+            timeout = request.timeout
+        return timeout / 1e6
+
+    def _dequeue(self, timeout: Optional[float] = None):
+        # Next request that is still wanted; cancelled and expired ones are answered here
+        while True:
+            item = self._queue.get(timeout=timeout)
+            if item is _STOP:
+                return item
+            enqueued, request = item
+            timeout_seconds = self._timeout(request)
+            if request.is_cancelled():
+                error = pb_utils.TritonError("Request was cancelled", pb_utils.TritonError.CANCELLED)
+            elif timeout_seconds and self.queue_policy.get("timeout_action", "REJECT") == "REJECT" and (
+                time.monotonic() - enqueued > timeout_seconds
+            ):
+                error = pb_utils.TritonError("Request timeout expired", pb_utils.TritonError.UNAVAILABLE)
+            else:
+                return request
+            self._send_final(request, pb_utils.InferenceResponse(error=error))
+
+    def _run(self, instance):
+        carry = None  # Request that did not fit into the previous batch
+        while True:
+            first = carry if carry is not None else self._dequeue()
+            carry = None
+            if first is _STOP:
+                return
+            batch = [first]
+            if self.max_queue_delay is not None:
+                size = self._batch_size(first)
+                deadline = time.monotonic() + self.max_queue_delay
+                while size < self.max_batch_size:
+                    try:
+                        request = self._dequeue(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if request is _STOP or size + self._batch_size(request) > self.max_batch_size:
+                        carry = request
+                        break
+                    batch.append(request)
+                    size += self._batch_size(request)
+            self._execute(instance, batch)
+
+    def _execute(self, instance, batch: list[pb_utils.InferenceRequest]):
+        try:
+            responses = instance.execute(batch)
+        except Exception as e:
+            logging.exception(f"{self.name}: execute failed")
+            for request in batch:
+                error = pb_utils.TritonError(f"{self.name}: {e}", pb_utils.TritonError.INTERNAL)
+                self._send_final(request, pb_utils.InferenceResponse(error=error))
+            return
+        if self.decoupled:
+            # Responses go out through the requests' senders
+            return
+        if responses is None or len(responses) != len(batch):
+            count = 0 if responses is None else len(responses)
+            for request in batch:
+                error = pb_utils.TritonError(f"{self.name}: execute returned {count} responses for {len(batch)}")
+                self._send_final(request, pb_utils.InferenceResponse(error=error))
+            return
+        for request, response in zip(batch, responses):
+            names = request.requested_output_names()
+            if names and not response.has_error():
+                outputs = [tensor for tensor in response.output_tensors() if tensor.name() in names]
+                response = pb_utils.InferenceResponse(output_tensors=outputs)
+            self._send_final(request, response)
+
+    @staticmethod
+    def _send_final(request: pb_utils.InferenceRequest, response: pb_utils.InferenceResponse):
+        request.get_response_sender().send(response, flags=pb_utils.TRITONSERVER_RESPONSE_COMPLETE_FINAL)
+
+
+class EnsembleModel(_ServedModel):
+    # Runs the steps of ensemble_scheduling as requests to the repository's models, each
+    # as soon as the tensors it maps in exist. Every step output in the output_map is
+    # requested, whatever the client asked for, as Triton does
+    def __init__(self, repository: "ModelRepository", name: str, config: dict):
+        self.name = name
+        self.config = config
+        self.decoupled = False
+        self.max_batch_size = config.get("max_batch_size", 0)
+        self.steps = config["ensemble_scheduling"]["step"]
+        self._repository = repository
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix=name)
+
+    def submit(self, request: pb_utils.InferenceRequest) -> Iterator[pb_utils.InferenceResponse]:
+        self.validate(request)
+        self._pool.submit(self._run, request)
+        return request.get_response_sender().responses()
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+    def _run(self, request: pb_utils.InferenceRequest):
+        tensors = {tensor.name(): tensor.as_numpy() for tensor in request.inputs()}
+        pending = list(self.steps)
+        while pending:
+            step = next((step for step in pending if all(name in tensors for name in step["input_map"].values())), None)
+            if step is None:
+                error = pb_utils.TritonError(f"in ensemble '{self.name}', no step can run on the tensors produced")
+                return HostedModel._send_final(request, pb_utils.InferenceResponse(error=error))
+            pending.remove(step)
+            if request.is_cancelled():
+                error = pb_utils.TritonError("Request was cancelled", pb_utils.TritonError.CANCELLED)
+                return HostedModel._send_final(request, pb_utils.InferenceResponse(error=error))
+            step_request = pb_utils.InferenceRequest(
+                model_name=step["model_name"],
+                inputs=[pb_utils.Tensor(name, tensors[source]) for name, source in step["input_map"].items()],
+                requested_output_names=list(step["output_map"]),
+                timeout=request.timeout,
+            )
+            response = next(iter(self._repository.stream(step_request)))
+            if response.has_error():
+                message = f"in ensemble '{self.name}', {response.error().message()}"
+                error = pb_utils.TritonError(message, response.error().code())
+                return HostedModel._send_final(request, pb_utils.InferenceResponse(error=error))
+            for tensor in response.output_tensors():
+                if tensor.name() in step["output_map"]:
+                    tensors[step["output_map"][tensor.name()]] = tensor.as_numpy()
+
+        names = request.requested_output_names() or [entry["name"] for entry in self.config.get("output", [])]
+        outputs = [pb_utils.Tensor(name, tensors[name]) for name in names if name in tensors]
+        HostedModel._send_final(request, pb_utils.InferenceResponse(output_tensors=outputs))
+
+
+class ModelRepository:
+    # Models served in this process; BLS requests of one model reach the others
+    def __init__(self, repository_dir: str, stubs: Optional[dict[str, dict]] = None):
+        self.repository_dir = repository_dir
+        self.models: dict[str, _ServedModel] = {}
+        pb_utils._repository = self
+        install_modules({"triton_python_backend_utils": vars(pb_utils)})
+        install_modules(stubs or {})
+
+    def load(
+        self, name: str, config_name: Optional[str] = None, model_file: Optional[str] = None, **overrides
+    ) -> _ServedModel:
+        # Overrides replace top-level config fields, e.g. max_batch_size=8 or parameters={...}.
+        # An ensemble needs its composing models loaded to serve requests
+        config = load_config(os.path.join(self.repository_dir, name), config_name)
+        if config.get("platform") == "ensemble":
+            self.models[name] = EnsembleModel(self, name, config)
+        else:
+            self.models[name] = HostedModel(self.repository_dir, name, config_name, model_file, **overrides)
+        return self.models[name]
+
+    def unload(self, name: str):
+        self.models.pop(name).shutdown()
+
+    def shutdown(self):
+        for name in list(self.models):
+            self.unload(name)
+        if pb_utils._repository is self:
+            pb_utils._repository = None
+
+    def stream(self, request: pb_utils.InferenceRequest) -> Iterator[pb_utils.InferenceResponse]:
+        model = self.models.get(request.model_name)
+        if model is None:
+            message = f"Request for unknown model: '{request.model_name}' is not found"
+            error = pb_utils.TritonError(message, pb_utils.TritonError.NOT_FOUND)
+            return iter([pb_utils.InferenceResponse(error=error)])
+        try:
+            return model.submit(request)
+        except pb_utils.TritonError as e:
+            return iter([pb_utils.InferenceResponse(error=e)])
+
+    def infer(self, model_name: str, inputs: dict[str, np.ndarray], **kwargs) -> list[pb_utils.InferenceResponse]:
+        # All responses of one request: exactly one for a regular model, one or more for a decoupled one
+        request = pb_utils.InferenceRequest(
+            model_name=model_name, inputs=[pb_utils.Tensor(name, array) for name, array in inputs.items()], **kwargs
+        )
+        return list(self.stream(request))
@@ -0,0 +1,93 @@
+"""System shared memory regions for the HTTP frontend (Triton's shared memory extension).
+
+A co-located client creates a POSIX shared memory object, registers it by
+name with its key, offset and size, and points inputs and outputs at it
+instead of sending their bytes; only the JSON header crosses the socket.
+Inputs are read from the mapping and outputs written into it, with the size
+check and error message Triton uses.
+"""
+
+import mmap
+import os
+import threading
+from typing import Optional
+
+SHM_ROOT = "/dev/shm"
+
+
+class SharedMemoryError(Exception):
+    pass
+
+
+class _Region:
+    def __init__(self, name: str, key: str, offset: int, byte_size: int):
+        self.name = name
+        self.key = key
+        self.offset = offset
+        self.byte_size = byte_size
+        fd = os.open(os.path.join(SHM_ROOT, key.lstrip("/")), os.O_RDWR)
+        try:
+            self.mapping = mmap.mmap(fd, offset + byte_size)
+        finally:
+            os.close(fd)
+
+    def status(self) -> dict:
+        return {"name": self.name, "key": self.key, "offset": self.offset, "byte_size": self.byte_size}
+
+
+class SystemSharedMemory:
+    def __init__(self):
+        self._regions: dict[str, _Region] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, key: str, offset: int, byte_size: int):
+        with self._lock:
+            if name in self._regions:
+                raise SharedMemoryError(f"shared memory region '{name}' already in manager")
+            try:
+                self._regions[name] = _Region(name, key, offset, byte_size)
+            except (OSError, ValueError) as e:
+                raise SharedMemoryError(f"Unable to open shared memory region: '{key}': {e}")
+
+    def unregister(self, name: Optional[str] = None):
+        # Without a name, every region
+        with self._lock:
+            names = list(self._regions) if name is None else [name] if name in self._regions else []
+            for region_name in names:
+                self._regions.pop(region_name).mapping.close()
+
+    def status(self, name: Optional[str] = None) -> list[dict]:
+        with self._lock:
+            if name is None:
+                return [region.status() for region in self._regions.values()]
+            if name not in self._regions:
+                raise SharedMemoryError(f"Unable to find system shared memory region: '{name}'")
+            return [self._regions[name].status()]
+
+    def read(self, name: str, offset: int, byte_size: int) -> bytes:
+        region = self._region(name, offset, byte_size)
+        start = region.offset + offset
+        return region.mapping[start : start + byte_size]
+
+    def write(self, name: str, offset: int, byte_size: int, data: bytes, output_name: str):
+        # byte_size is the room the request gave this output
+        region = self._region(name, offset, byte_size)
+        if len(data) > byte_size:
+            raise SharedMemoryError(
+                f"shared memory size specified with the request for output '{output_name}' "
+                f"({byte_size} bytes) should be at least {len(data)} bytes to hold the results"
+            )
+        start = region.offset + offset
+        region.mapping[start : start + len(data)] = data
+
+    def _region(self, name: str, offset: int, byte_size: int) -> _Region:
+        with self._lock:
+            region = self._regions.get(name)
+        if region is None:
+            raise SharedMemoryError(f"Unable to find system shared memory region: '{name}'")
+        if offset + byte_size > region.byte_size:
+            raise SharedMemoryError(
+                f"Invalid offset + byte size for shared memory region: '{name}', "
+                f"{offset + byte_size} > {region.byte_size}"
+            )
+        return region
@@ -0,0 +1,37 @@
+"""Per-request parameters: a named preset plus optional overrides."""
+
+from typing import Callable, Optional
+
+
+def resolve_params(
+    request,
+    get_input_tensor_by_name: Callable,
+    presets: dict[str, dict],
+    default: str,
+    selector: str = "quality",
+    bounds: Optional[dict[str, tuple]] = None,
+) -> dict:
+    # The selector input names the preset. Every preset key can be overridden by
+    # an optional input tensor of the same name; the override is cast to the type
+    # of the preset value and must lie within bounds[key] = (low, high), inclusive.
+    # Out of range overrides raise ValueError before any work is done.
+    selector_tensor = get_input_tensor_by_name(request, selector)
+    name = default
+    if selector_tensor is not None:
+        name = selector_tensor.as_numpy().reshape(-1)[0]
+        name = name.decode("utf-8") if isinstance(name, bytes) else str(name)
+    if name not in presets:
+        raise ValueError(f"Unknown {selector} '{name}', expected one of {sorted(presets)}")
+
+    params = dict(presets[name])
+    for key, default_value in presets[name].items():
+        tensor = get_input_tensor_by_name(request, key)
+        if tensor is not None:
+            value = tensor.as_numpy().reshape(-1)[0]
+            value = value.decode("utf-8") if isinstance(value, bytes) else value
+            params[key] = type(default_value)(value)
+            if bounds and key in bounds:
+                low, high = bounds[key]
+                if not low <= params[key] <= high:
+                    raise ValueError(f"{key} must be between {low} and {high}, got {params[key]}")
+    return params
@@ -0,0 +1,210 @@
+"""Model components that are loaded on first use and given back when idle.
+
+The texture pipelines take as much memory as the geometry ones, but only
+textured requests need them. A LazyComponent loads its component the first
+time it is used. After idle_seconds without use, or as soon as it is idle while
+the device is above its memory ceiling, it either offloads the component to
+host memory ("cpu"), from where the next use moves it back much faster than a
+load from disk, or drops it ("unload"). An offloaded component is dropped too
+once the process is above the host memory ceiling.
+
+Every transition counts as model_events_total{event="<name>_<load|offload|restore|unload>"},
+and model_state reports <name>_residency (0 unloaded, 1 offloaded, 2 on the device)
+next to the process' device and host memory.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+UNLOADED, OFFLOADED, RESIDENT = 0, 1, 2
+OFFLOAD_MODES = ("cpu", "unload", "none")
+
+
+def device_memory_used() -> int:
+    # Bytes in use on the current device by every process, 0 without CUDA
+    try:
+        import torch
+    except ImportError:
+        return 0
+    if not torch.cuda.is_available():
+        return 0
+    free, total = torch.cuda.mem_get_info()
+    return total - free
+
+
+def process_device_memory() -> int:
+    # Bytes this process holds in the CUDA caching allocator, 0 without CUDA
+    try:
+        import torch
+    except ImportError:
+        return 0
+    return torch.cuda.memory_reserved() if torch.cuda.is_available() else 0
+
+
+def process_host_memory() -> int:
+    # Resident set size of this process
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def release_device_memory():
+    # Hands cached allocator blocks back to the driver, so other instances can use them
+    gc.collect()
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class LazyComponent:
+    def __init__(
+        self,
+        name: str,
+        load: Callable[[], Any],
+        metrics,
+        offload: str = "cpu",
+        move: Optional[Callable[[Any, str], None]] = None,
+        idle_seconds: float = 300.0,
+        device_memory_limit_bytes: int = 0,
+        host_memory_limit_bytes: int = 0,
+        device: str = "cuda",
+    ):
+        # load() returns the component on the device, move(component, device) moves it
+        # between "cpu" and the device in place. Without move, "cpu" acts as "unload".
+        # Limits of 0 mean no ceiling, idle_seconds 0 means no idle timeout
+        if offload not in OFFLOAD_MODES:
+            raise ValueError(f"offload must be one of {', '.join(OFFLOAD_MODES)}, got '{offload}'")
+        self.name = name
+        self.metrics = metrics
+        self.offload = offload if offload != "cpu" or move is not None else "unload"
+        self.idle_seconds = idle_seconds
+        self.device_memory_limit_bytes = device_memory_limit_bytes
+        self.host_memory_limit_bytes = host_memory_limit_bytes
+        self.device = device
+        self._load = load
+        self._move = move
+
+        self._lock = threading.Lock()
+        self._component = None
+        self._state = UNLOADED
+        self._users = 0
+        self._last_used = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if self.offload != "none" and (idle_seconds > 0 or device_memory_limit_bytes > 0):
+            self._thread = threading.Thread(target=self._watch, name=f"{name}-residency", daemon=True)
+            self._thread.start()
+        self._report()
+
+    @property
+    def state(self) -> int:
+        return self._state
+
+    def preload(self):
+        with self.use():
+            pass
+
+    def adopt(self, component: Any):
+        # A component loaded up front elsewhere, e.g. side by side with the others
+        with self._lock:
+            self._component = component
+            self._transition(RESIDENT, "load", "preload")
+        self._report()
+
+    @contextmanager
+    def use(self) -> Iterator[Any]:
+        # The component on the device, loaded or moved back first if need be; it is not
+        # given back while in use
+        with self._lock:
+            self._users += 1
+            try:
+                component = self._acquire()
+            except BaseException:
+                self._users -= 1
+                raise
+        try:
+            yield component
+        finally:
+            with self._lock:
+                self._users -= 1
+                self._last_used = time.monotonic()
+                if not self._users and self._over_device_ceiling():
+                    self._release("device memory ceiling")
+            self._report()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._component, self._state = None, UNLOADED
+
+    def _acquire(self) -> Any:
+        if self._state == RESIDENT:
+            return self._component
+        if self._state == OFFLOADED:
+            with self.metrics.time(f"{self.name}_restore"):
+                self._move(self._component, self.device)
+            self._transition(RESIDENT, "restore", "in use again")
+            return self._component
+        with self.metrics.time(f"{self.name}_load"):
+            self._component = self._load()
+        self._transition(RESIDENT, "load", "first use")
+        return self._component
+
+    def _release(self, reason: str):
+        # Called with the lock held and nobody using the component
+        if self._state == RESIDENT and self.offload == "cpu":
+            with self.metrics.time(f"{self.name}_offload"):
+                self._move(self._component, "cpu")
+            release_device_memory()
+            self._transition(OFFLOADED, "offload", reason)
+        elif self._state != UNLOADED:
+            self._component = None
+            release_device_memory()
+            self._transition(UNLOADED, "unload", reason)
+
+    def _transition(self, state: int, event: str, reason: str):
+        self._state = state
+        self.metrics.increment(f"{self.name}_{event}")
+        logging.info(f"{self.name} : {event} ({reason}), {self._format_memory()}")
+
+    def _watch(self):
+        interval = min(self.idle_seconds or 30.0, 30.0) / 2
+        while not self._stop.wait(interval):
+            with self._lock:
+                if self._users or self._state == UNLOADED:
+                    continue
+                if self._over_device_ceiling():
+                    self._release("device memory ceiling")
+                elif self.idle_seconds and self._state == RESIDENT:
+                    if time.monotonic() - self._last_used >= self.idle_seconds:
+                        self._release(f"idle for {self.idle_seconds:g}s")
+                if self._state == OFFLOADED and self._over_host_ceiling():
+                    self._component = None
+                    gc.collect()
+                    self._transition(UNLOADED, "unload", "host memory ceiling")
+            self._report()
+
+    def _over_device_ceiling(self) -> bool:
+        if self.offload == "none" or self._state != RESIDENT or not self.device_memory_limit_bytes:
+            return False
+        return device_memory_used() > self.device_memory_limit_bytes
+
+    def _over_host_ceiling(self) -> bool:
+        return bool(self.host_memory_limit_bytes) and process_host_memory() > self.host_memory_limit_bytes
+
+    def _report(self):
+        self.metrics.set(f"{self.name}_residency", self._state)
+        self.metrics.set("device_memory_bytes", process_device_memory())
+        self.metrics.set("host_memory_bytes", process_host_memory())
+
+    def _format_memory(self) -> str:
+        return f"device {process_device_memory() / 2**20:.0f} MB, host {process_host_memory() / 2**20:.0f} MB"
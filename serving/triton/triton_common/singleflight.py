@@ -0,0 +1,104 @@
+"""In-flight deduplication of identical generation requests.
+
+The result cache answers a repeat once the first result exists; this covers
+the window before that. The first caller for a key leads the flight and does
+the work, callers with the same key that arrive while it runs join it and get
+its result, or its exception, when the flight lands.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+
+class Flight:
+    def __init__(self):
+        self.future: Future = Future()
+        self._lock = threading.Lock()
+        self._cancel_checks: list[Callable[[], bool]] = []
+        self._preview_callbacks: list[Callable[[Any], None]] = []
+        self._preview = None
+
+    def add(self, is_cancelled: Callable[[], bool], on_preview: Optional[Callable[[Any], None]] = None):
+        # Returns whether the caller got on, and the preview that went out before it did.
+        # Nobody gets on once every caller so far has given up: the work is about to be
+        # dropped, so a new caller has to start a flight of its own
+        with self._lock:
+            if self._cancel_checks and all(check() for check in self._cancel_checks):
+                return False, None
+            self._cancel_checks.append(is_cancelled)
+            if on_preview is not None:
+                self._preview_callbacks.append(on_preview)
+            return True, self._preview
+
+    def is_cancelled(self) -> bool:
+        # Evaluated under the lock, so that add() and this never disagree about a caller
+        with self._lock:
+            return all(check() for check in self._cancel_checks)
+
+    def preview(self, value):
+        with self._lock:
+            self._preview = value
+            callbacks = list(self._preview_callbacks)
+        for callback in callbacks:
+            callback(value)
+
+    def land(self, value):
+        self.future.set_result(value)
+
+    def track(self, future: Future):
+        # The leader's own future: should it fail before the flight landed, so does the flight
+        def done(leader: Future):
+            if leader.exception() is not None:
+                self.fail(leader.exception())
+
+        future.add_done_callback(done)
+
+    def fail(self, error: BaseException):
+        # A flight that already landed keeps its result; later failures are the leader's own
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[str, Flight] = {}
+        self.led = 0
+        self.joined = 0
+
+    def join(
+        self,
+        key: str,
+        is_cancelled: Callable[[], bool] = lambda: False,
+        on_preview: Optional[Callable[[Any], None]] = None,
+    ) -> tuple[Flight, bool]:
+        # The key's flight and whether the caller leads it; the leader lands or fails it
+        with self._lock:
+            flight = self._flights.get(key)
+            joined, preview = flight.add(is_cancelled, on_preview) if flight is not None else (False, None)
+            if joined:
+                self.joined += 1
+            else:
+                flight = Flight()
+                flight.add(is_cancelled, on_preview)
+                self._flights[key] = flight
+                self.led += 1
+        if not joined:
+            flight.future.add_done_callback(lambda _: self._forget(key, flight))
+        elif preview is not None and on_preview is not None:
+            # Late joiners still get the intermediate result that already went out
+            on_preview(preview)
+        return flight, not joined
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def format_stats(self) -> str:
+        return f"{len(self)} in flight, {self.led} led, {self.joined} joined"
+
+    def _forget(self, key: str, flight: Flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
@@ -0,0 +1,189 @@
+"""Producer/consumer stage engine for the Triton Python backends.
+
+Every stage owns a bounded input queue and a few worker threads, so the CPU
+stages of one job (decode, export, ...) run while another job is on the GPU.
+A full queue blocks the stage in front of it, which keeps memory bounded.
+Before a stage runs a job, an optional check can drop it (its client has
+gone), failing its future with RequestCancelled.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional
+
+from triton_common.cancellation import RequestCancelled
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        workers: int = 1,
+        queue_size: int = 8,
+        batch_size: Optional[int] = None,
+        batch_wait: float = 0.0,
+        batch_key: Optional[Callable[[Any], Hashable]] = None,
+    ):
+        # `fn` takes one job, or a list of up to batch_size jobs for a batching stage,
+        # and returns the same
+        self.name = name
+        self.fn = fn
+        self.batched = batch_size is not None
+        self.workers = 1 if self.batched else workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.batch_key = batch_key
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self._lock = threading.Lock()
+        self._busy = 0.0
+        self._processed = 0
+        self._batches = 0
+        self._pending: list = []
+
+    def record(self, busy: float, items: int):
+        with self._lock:
+            self._busy += busy
+            self._processed += items
+            self._batches += 1
+
+    def stats(self, elapsed: float) -> dict:
+        with self._lock:
+            return {
+                "queue": self.queue.qsize(),
+                "processed": self._processed,
+                "avg_batch": self._processed / self._batches if self._batches else 0.0,
+                "utilisation": self._busy / (elapsed * self.workers) if elapsed > 0 else 0.0,
+            }
+
+    def next_batch(self) -> list:
+        # Only ever called from the single worker of a batching stage. Items that
+        # do not fit the current batch are kept, in order, for the next one.
+        backlog, self._pending = self._pending, []
+        first = backlog.pop(0) if backlog else self.queue.get()
+        if first is _STOP:
+            self._pending = backlog
+            return [first]
+
+        key = self._key(first)
+        batch = [first]
+        for item in backlog:
+            if len(batch) < self.batch_size and item is not _STOP and self._key(item) == key:
+                batch.append(item)
+            else:
+                self._pending.append(item)
+
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and self._key(item) == key:
+                batch.append(item)
+            else:
+                self._pending.append(item)
+                if item is _STOP:
+                    break
+        return batch
+
+    def _key(self, item) -> Hashable:
+        return self.batch_key(item[0]) if self.batch_key else None
+
+
+class StagedPipeline:
+    def __init__(
+        self,
+        stages: list[Stage],
+        observer: Optional[Callable[[str, float, int], None]] = None,
+        cancelled: Optional[Callable[[Any, str], bool]] = None,
+    ):
+        # observer(stage name, seconds, batch size) is called after every stage call;
+        # the batch size is None for unbatched stages. cancelled(job, stage name) is
+        # asked before a stage takes a job.
+        self.stages = stages
+        self.observer = observer
+        self.cancelled = cancelled
+        self._threads: list[threading.Thread] = []
+        self._started = 0.0
+
+    def start(self):
+        self._started = time.monotonic()
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run, args=(index,), name=f"{stage.name}-{worker}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self):
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, job: Any, stage: Optional[str] = None) -> Future:
+        # Jobs that already have the output of the earlier stages can skip them
+        index = 0 if stage is None else [s.name for s in self.stages].index(stage)
+        future: Future = Future()
+        self.stages[index].queue.put((job, future))
+        return future
+
+    def stats(self) -> dict[str, dict]:
+        elapsed = time.monotonic() - self._started
+        return {stage.name: stage.stats(elapsed) for stage in self.stages}
+
+    def format_stats(self) -> str:
+        return ", ".join(
+            f"{name}[q={s['queue']} util={s['utilisation']:.0%} batch={s['avg_batch']:.1f}]"
+            for name, s in self.stats().items()
+        )
+
+    def _run(self, index: int):
+        stage = self.stages[index]
+        downstream = self.stages[index + 1].queue if index + 1 < len(self.stages) else None
+
+        while True:
+            items = stage.next_batch() if stage.batched else [stage.queue.get()]
+            if items[0] is _STOP:
+                return
+            # Jobs whose future was already resolved elsewhere (failed, cancelled) are dropped
+            items = [it for it in items if not it[1].done()]
+            if self.cancelled is not None:
+                for job, future in items:
+                    if self.cancelled(job, stage.name):
+                        future.set_exception(RequestCancelled(stage.name))
+                items = [it for it in items if not it[1].done()]
+            if not items:
+                continue
+
+            jobs = [job for job, _ in items]
+            start = time.monotonic()
+            try:
+                outputs = stage.fn(jobs) if stage.batched else [stage.fn(jobs[0])]
+            except Exception as e:
+                logging.exception(f"Stage {stage.name} failed")
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            finally:
+                busy = time.monotonic() - start
+                stage.record(busy, len(items))
+                if self.observer is not None:
+                    self.observer(stage.name, busy, len(items) if stage.batched else None)
+
+            for (_, future), output in zip(items, outputs):
+                if downstream is None:
+                    future.set_result(output)
+                else:
+                    downstream.put((output, future))
@@ -0,0 +1,87 @@
+"""Load-time warmup through the models' own request path, timed per batch size.
+
+A Python backend instance runs its warmup at the end of initialize(), so CUDA
+context setup, kernel autotuning and allocator growth are paid before Triton
+marks the model ready instead of by the first client. The batch sizes come
+from the "warmup_batch_sizes" parameter; without it, from the dynamic batcher
+config (1, the preferred batch sizes and max_batch_size).
+
+Warmup requests are built by the model itself, Triton never delivered them, so
+they must not be asked whether they were cancelled; is_warmup_request() tells
+them apart (see triton_common.cancellation.is_cancelled).
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+
+WARMUP_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "warmup.png")
+
+# id() of the requests execute_requests() is running, they stay alive meanwhile
+_warmup_requests: set[int] = set()
+_warmup_lock = threading.Lock()
+
+
+def warmup_image_bytes() -> bytes:
+    # Small bundled photo of a single object, a realistic input for the 3D models
+    with open(WARMUP_IMAGE, "rb") as f:
+        return f.read()
+
+
+def warmup_batch_sizes(model_config: dict, parameters: dict) -> list[int]:
+    # An empty "warmup_batch_sizes" disables warmup
+    if "warmup_batch_sizes" in parameters:
+        return [int(size) for size in parameters["warmup_batch_sizes"].split(",") if size.strip()]
+    batching = model_config.get("dynamic_batching")
+    max_batch_size = model_config.get("max_batch_size", 0)
+    if batching is None or max_batch_size <= 0:
+        return [1]
+    sizes = [1, *batching.get("preferred_batch_size", []), max_batch_size]
+    return sorted({int(size) for size in sizes})
+
+
+def run_warmup(warm: Callable[[int], None], batch_sizes: list[int], metrics) -> float:
+    # warm(batch_size) sends one batch of that size through the model
+    timings: dict[int, float] = {}
+    for batch_size in batch_sizes:
+        start = time.time()
+        warm(batch_size)
+        timings[batch_size] = time.time() - start
+        metrics.observe("warmup", timings[batch_size], batch_size)
+
+    total = sum(timings.values())
+    metrics.set("warmup_seconds", total)
+    if timings:
+        breakdown = ", ".join(f"batch {size}={seconds:.1f}s" for size, seconds in timings.items())
+        logging.info(f"Warmup : {breakdown}, total={total:.1f}s")
+    return total
+
+
+def execute_requests(pb_utils, model, inputs: list[dict[str, np.ndarray]], output_names: list[str]):
+    # Runs execute() on requests built like BLS requests, one per inputs dict, as one batch
+    requests = [
+        pb_utils.InferenceRequest(
+            model_name=model.model_name,
+            requested_output_names=output_names,
+            inputs=[pb_utils.Tensor(name, array) for name, array in request_inputs.items()],
+        )
+        for request_inputs in inputs
+    ]
+    with _warmup_lock:
+        _warmup_requests.update(id(request) for request in requests)
+    try:
+        responses = model.execute(requests)
+    finally:
+        with _warmup_lock:
+            _warmup_requests.difference_update(id(request) for request in requests)
+    for response in responses:
+        if response.has_error():
+            raise RuntimeError(f"Warmup failed: {response.error().message()}")
+
+
+def is_warmup_request(request) -> bool:
+    return id(request) in _warmup_requests
@@ -0,0 +1,29 @@
+"""Per-request scratch directory for libraries that only accept file paths."""
+
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+# RAM-backed, so spilled files never touch the disk
+TMPFS = "/dev/shm"
+
+
+class Workdir:
+    def __init__(self):
+        self._path: Optional[str] = None
+
+    def path(self, name: str) -> str:
+        # The directory is only created when something actually needs a path
+        if self._path is None:
+            parent = TMPFS if os.access(TMPFS, os.W_OK) else None
+            self._path = tempfile.mkdtemp(prefix="triton-", dir=parent)
+        return os.path.join(self._path, name)
+
+    def __enter__(self) -> "Workdir":
+        return self
+
+    def __exit__(self, *exc):
+        if self._path is not None:
+            shutil.rmtree(self._path, ignore_errors=True)
+            self._path = None